@@ -4,41 +4,81 @@ import streamlit as st
 import os
 import re
 from datetime import datetime
-from glob import glob
 
 from src.writer_agent import WriterAgent
 from src.doc_gen import DocumentGenerator
+from src.maintenance import load_task_index
 
 st.set_page_config(page_title="AI 深度写作系统", page_icon="📝", layout="wide")
 
 BASE_OUTPUT_DIR = "./output"
 BASE_DATA_DIR = "./data/uploads"
 
-def render_article_preview(markdown_text, image_base_dir):
-    parts = re.split(r'(\!\[.*?\]\(.*?\))', markdown_text)
-    for part in parts:
-        img_match = re.match(r'\!\[(.*?)\]\((.*?)\)', part)
-        if img_match:
-            alt_text = img_match.group(1)
-            raw_path = img_match.group(2)
-            possible_paths = [
-                raw_path,
-                os.path.join(image_base_dir, raw_path),
-                os.path.join(image_base_dir, "assets", os.path.basename(raw_path))
-            ]
-            found_img = None
-            for p in possible_paths:
-                p = p.replace("/", os.sep).replace("\\", os.sep)
-                if os.path.exists(p):
-                    found_img = p
-                    break
-            if found_img:
-                st.image(found_img, caption=alt_text)
+# 预览分页：每页渲染的章节数
+SECTIONS_PER_PAGE = 3
+
+def _resolve_image(raw_path, image_base_dir):
+    possible_paths = [
+        raw_path,
+        os.path.join(image_base_dir, raw_path),
+        os.path.join(image_base_dir, "assets", os.path.basename(raw_path))
+    ]
+    for p in possible_paths:
+        p = p.replace("/", os.sep).replace("\\", os.sep)
+        if os.path.exists(p):
+            return p
+    return None
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def load_article(md_path, mtime):
+    """
+    解析文章为章节列表 (按文件 mtime 缓存，文件不变时不再重复解析与探测图片路径)
+    每章: {"title": 标题, "blocks": [("md", 文本) | ("img", 说明, 图片路径或 None, 原始路径)]}
+    """
+    with open(md_path, "r", encoding="utf-8") as f:
+        markdown_text = f.read()
+    image_base_dir = os.path.dirname(md_path)
+
+    chunks = [("开篇", [])]
+    for line in markdown_text.split("\n"):
+        if line.strip().startswith("## "):
+            chunks.append((line.strip()[3:], []))
+        chunks[-1][1].append(line)
+
+    sections = []
+    for title, lines in chunks:
+        blocks = []
+        for part in re.split(r'(\!\[.*?\]\(.*?\))', "\n".join(lines)):
+            img_match = re.match(r'\!\[(.*?)\]\((.*?)\)', part)
+            if img_match:
+                raw_path = img_match.group(2)
+                blocks.append(("img", img_match.group(1), _resolve_image(raw_path, image_base_dir), raw_path))
+            elif part.strip():
+                blocks.append(("md", part))
+        if blocks:
+            sections.append({"title": title, "blocks": blocks})
+    return sections
+
+def render_article_preview(md_path, key):
+    """分页渲染文章，只渲染当前页的章节"""
+    sections = load_article(md_path, os.path.getmtime(md_path))
+    if not sections:
+        return
+    pages = (len(sections) + SECTIONS_PER_PAGE - 1) // SECTIONS_PER_PAGE
+    page = 1
+    if pages > 1:
+        page = st.selectbox(
+            "章节", range(1, pages + 1), key=f"{key}_page",
+            format_func=lambda i: " / ".join(s["title"] for s in sections[(i - 1) * SECTIONS_PER_PAGE:i * SECTIONS_PER_PAGE])
+        )
+    for sec in sections[(page - 1) * SECTIONS_PER_PAGE:page * SECTIONS_PER_PAGE]:
+        for block in sec["blocks"]:
+            if block[0] == "md":
+                st.markdown(block[1])
+            elif block[2]:
+                st.image(block[2], caption=block[1])
             else:
-                st.warning(f"⚠️ 图片丢失: {raw_path}")
-        else:
-            if part.strip():
-                st.markdown(part)
+                st.warning(f"⚠️ 图片丢失: {block[3]}")
 
 if "messages" not in st.session_state:
     st.session_state.messages = [{"role": "assistant", "content": "你好！我是主编。请输入主题，我将先检索全网信息，再为您写作。"}]
@@ -58,17 +98,14 @@ with st.sidebar:
                 w.write(f.getbuffer())
         st.success(f"✅ 已挂载 {len(uploaded_files)} 份资料")
     st.divider()
+    tasks = {}
     if os.path.exists(BASE_OUTPUT_DIR):
-        tasks = sorted([d for d in os.listdir(BASE_OUTPUT_DIR) if os.path.isdir(os.path.join(BASE_OUTPUT_DIR, d))], reverse=True)
-        selected_task = st.selectbox("查看旧文", ["-- 选择任务 --"] + tasks)
-        if selected_task and selected_task != "-- 选择任务 --":
-            task_path = os.path.join(BASE_OUTPUT_DIR, selected_task)
-            md_files = glob(os.path.join(task_path, "*.md"))
-            if md_files:
-                with open(md_files[0], "r", encoding="utf-8") as f:
-                    content = f.read()
-                if st.button("📖 在线阅读"):
-                    render_article_preview(content, task_path)
+        # 读取轻量任务索引 (output/tasks_index.json)，仅在任务目录增删时才重新扫描
+        tasks = load_task_index(BASE_OUTPUT_DIR)
+        selected_task = st.selectbox("查看旧文", ["-- 选择任务 --"] + list(tasks))
+        if selected_task in tasks and st.button("📖 在线阅读"):
+            # 记在会话状态中，翻页触发的重跑不会收起预览
+            st.session_state.preview_task = selected_task
 
 st.title("📝 Agentic Writer Pro")
 st.caption("Mixed Retrieval | Auto-Correction | Source Citation")
@@ -77,7 +114,15 @@ for msg in st.session_state.messages:
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
 
-if prompt := st.chat_input("输入文章主题...", disabled=st.session_state.processing):
+prompt = st.chat_input("输入文章主题...", disabled=st.session_state.processing)
+
+preview_task = st.session_state.get("preview_task")
+if not prompt and preview_task in tasks:
+    st.divider()
+    st.subheader(f"📖 {preview_task}")
+    render_article_preview(tasks[preview_task], key=f"preview_{preview_task}")
+
+if prompt:
     st.session_state.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user"):
         st.markdown(prompt)
@@ -101,9 +146,15 @@ if prompt := st.chat_input("输入文章主题...", disabled=st.session_state.pr
             
             # Step 2
             status.write("🧠 正在规划大纲 ...")
-            outline = agent.plan_outline(prompt)
+            outline = []
+            # 流式规划：每解析出一章就立即派发预取任务，无需等待整个大纲生成完毕
+            for section in agent.iter_outline(prompt):
+                outline.append(section)
+                agent.prefetch_section(prompt, section, len(outline))
+                status.write(f"　📌 {len(outline)}. {section['title']}")
             
             if not outline:
+                agent.close()
                 status.update(label="❌ 大纲生成失败", state="error")
                 st.error("无法生成有效大纲，请重试。")
                 st.session_state.processing = False
@@ -148,6 +199,7 @@ if prompt := st.chat_input("输入文章主题...", disabled=st.session_state.pr
 
                 full_content += result['markdown']
                 prog_bar.progress((i + 1) / len(outline))
+            agent.close()
             
             # Step 4
             status.write("📄 生成文档...")
@@ -161,7 +213,8 @@ if prompt := st.chat_input("输入文章主题...", disabled=st.session_state.pr
         st.divider()
         tab1, tab2 = st.tabs(["📖 阅读", "💾 下载"])
         with tab1:
-            render_article_preview(full_content, task_dir)
+            st.session_state.preview_task = os.path.basename(task_dir)
+            render_article_preview(md_path, key=f"preview_{st.session_state.preview_task}")
         with tab2:
             col1, col2 = st.columns(2)
             with col1:
@@ -0,0 +1,134 @@
+# benchmarks/bench_ann.py
+"""
+近似检索的召回率 / 延迟基准：暴力检索 (精确) vs Chroma HNSW (多组 ef_search) vs int8 量化索引
+
+用法:
+    python benchmarks/bench_ann.py --n 200000 --dim 1024 --queries 100
+"""
+
+import os
+import sys
+import time
+import tempfile
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.vector_index import QuantizedIndex
+
+
+def make_data(n, dim, n_queries, seed=0):
+    """带簇结构的单位向量，比纯高斯噪声更接近真实 Embedding 分布"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(16, n // 1000), dim)).astype(np.float32)
+    data = centers[rng.integers(0, len(centers), n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    queries = data[rng.integers(0, n, n_queries)] + 0.1 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return data, queries
+
+
+def timed(fn, queries):
+    latencies, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(fn(q))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def recall(results, truth, k):
+    return np.mean([len(set(r[:k]) & set(t[:k])) / k for r, t in zip(results, truth)])
+
+
+def report(name, results, truth, k, p50, p95):
+    print(f"{name:<28} recall@{k}={recall(results, truth, k):.3f}  p50={p50:7.2f}ms  p95={p95:7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--M", type=int, default=32)
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 128, 256])
+    parser.add_argument("--rerank-factor", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--files", type=int, default=100, help="过滤场景：向量平均分属的文件 (标签) 数，查询只允许其中一个")
+    args = parser.parse_args()
+
+    print(f"📊 数据集: n={args.n}, dim={args.dim}, queries={args.queries}, k={args.k}")
+    data, queries = make_data(args.n, args.dim, args.queries)
+    ids = [str(i) for i in range(args.n)]
+    print(f"   float32 向量: {data.nbytes / 2**20:.1f} MB, int8 编码: {data.nbytes / 4 / 2**20:.1f} MB")
+
+    # 1. 暴力检索 (基准真值)
+    def brute(q):
+        scores = data @ q
+        top = np.argpartition(-scores, args.k)[:args.k]
+        return [ids[i] for i in top[np.argsort(-scores[top])]]
+    truth, p50, p95 = timed(brute, queries)
+    report("brute-force (float32)", truth, truth, args.k, p50, p95)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 2. int8 量化 + 精确重打分
+        index = QuantizedIndex(os.path.join(tmp, "int8"))
+        start = time.perf_counter()
+        index.build(ids, data)
+        print(f"   int8 索引构建: {time.perf_counter() - start:.1f}s")
+        for factor in args.rerank_factor:
+            res, p50, p95 = timed(lambda q: [i for i, _ in index.search(q, args.k, rerank_factor=factor)], queries)
+            report(f"int8 rerank x{factor}", res, truth, args.k, p50, p95)
+
+        # 2b. 按标签过滤 (共享库的命名空间检索)：只允许一个文件的向量
+        tags = [f"file{i % args.files}" for i in range(args.n)]
+        allowed = {"file0"}
+        mask = np.array([t in allowed for t in tags])
+        rows = np.flatnonzero(mask)
+
+        def brute_filtered(q):
+            scores = data[rows] @ q
+            top = np.argpartition(-scores, min(args.k, len(rows) - 1))[:args.k]
+            return [ids[rows[i]] for i in top[np.argsort(-scores[top])]]
+        filtered_truth, p50, p95 = timed(brute_filtered, queries)
+        report("brute-force filtered", filtered_truth, filtered_truth, args.k, p50, p95)
+        index.build(ids, data, tags)
+        res, p50, p95 = timed(
+            lambda q: [i for i, _ in index.search(q, args.k, rerank_factor=4, allowed_tags=allowed)], queries
+        )
+        report("int8 filtered rerank x4", res, filtered_truth, args.k, p50, p95)
+
+        # 3. Chroma HNSW
+        try:
+            import chromadb
+        except ImportError:
+            print("⚠️ 未安装 chromadb，跳过 HNSW 基准")
+            return
+        client = chromadb.PersistentClient(path=os.path.join(tmp, "chroma"))
+        collection = client.create_collection("bench", metadata={
+            "hnsw:space": "ip",
+            "hnsw:M": args.M,
+            "hnsw:construction_ef": args.ef_construction,
+            "hnsw:search_ef": args.ef_search[0],
+        })
+        start = time.perf_counter()
+        for offset in range(0, args.n, 5000):
+            collection.add(ids=ids[offset:offset + 5000], embeddings=data[offset:offset + 5000])
+        print(f"   HNSW 索引构建 (M={args.M}, ef_construction={args.ef_construction}): {time.perf_counter() - start:.1f}s")
+        from chromadb.api.shared_system_client import SharedSystemClient
+        for ef in args.ef_search:
+            collection.modify(configuration={"hnsw": {"ef_search": ef}})
+            # 已加载的 HNSW 段会缓存 ef_search，需重新打开客户端才能生效
+            SharedSystemClient.clear_system_cache()
+            client = chromadb.PersistentClient(path=os.path.join(tmp, "chroma"))
+            collection = client.get_collection("bench")
+            res, p50, p95 = timed(
+                lambda q: collection.query(query_embeddings=[q], n_results=args.k, include=[])["ids"][0], queries
+            )
+            report(f"hnsw ef_search={ef}", res, truth, args.k, p50, p95)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/bench_docx.py
+"""
+Word 导出基准：合成大篇幅 Markdown (多章节 + 每章配图)，对比不同进程数下的转换耗时，
+以及渲染缓存在原样 / 少量修改后重新导出时的耗时
+
+用法:
+    python benchmarks/bench_docx.py --chapters 200 --workers 1 2 4 8
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.doc_gen import DocumentGenerator
+
+
+def make_images(assets_dir, n, size=(1600, 900)):
+    """生成 n 张带噪声的 JPEG (噪声避免被压缩得过小，接近真实配图体积)"""
+    from PIL import Image
+
+    os.makedirs(assets_dir, exist_ok=True)
+    paths = []
+    for i in range(n):
+        img = Image.effect_noise(size, 60 + i % 40).convert("RGB")
+        path = os.path.join(assets_dir, f"img_{i}.jpg")
+        img.save(path, quality=85)
+        paths.append(path)
+    return paths
+
+
+def make_markdown(chapters, paragraphs, image_names, seed=0):
+    rng = random.Random(seed)
+    words = "大模型 检索增强 向量数据库 推理 延迟 吞吐 **关键指标** 工程实践 部署 评测 数据 系统".split()
+    lines = ["# 合成长文基准报告", ""]
+    for c in range(chapters):
+        lines += [f"## 第 {c + 1} 章 章节标题", ""]
+        for p in range(paragraphs):
+            if p == paragraphs // 2:
+                lines += [f"### 小节 {c + 1}.{p}", ""]
+            lines += ["".join(rng.choice(words) for _ in range(80)), ""]
+        lines += ["> " + "".join(rng.choice(words) for _ in range(30)), ""]
+        lines += [f"![图：chapter {c}](assets/{image_names[c % len(image_names)]})", ""]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chapters", type=int, default=200)
+    parser.add_argument("--paragraphs", type=int, default=12)
+    parser.add_argument("--images", type=int, default=50, help="不同图片的数量 (章节循环使用)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        images = make_images(os.path.join(tmp, "assets"), args.images)
+        markdown = make_markdown(args.chapters, args.paragraphs, [os.path.basename(p) for p in images])
+        print(f"📊 Markdown: {len(markdown) / 1024:.0f} KB, {args.chapters} 章, {args.images} 张图片, CPU: {os.cpu_count()}")
+
+        devnull = open(os.devnull, "w")
+        for workers in sorted(set(args.workers)):
+            out = os.path.join(tmp, f"out_{workers}.docx")
+            start = time.perf_counter()
+            stdout, sys.stdout = sys.stdout, devnull  # 屏蔽逐张图片的日志
+            try:
+                DocumentGenerator(max_workers=workers, cache_dir=None).convert_markdown_to_docx(markdown, out)
+            finally:
+                sys.stdout = stdout
+            elapsed = time.perf_counter() - start
+            print(f"  workers={workers:<3} {elapsed:6.2f}s  ({os.path.getsize(out) / 2**20:.1f} MB)")
+
+        # 渲染缓存：首次导出 / 原样重新导出 / 修改一章后重新导出
+        gen = DocumentGenerator(max_workers=max(args.workers), cache_dir=os.path.join(tmp, "docx_cache"))
+        edited = markdown.replace("## 第 1 章", "## 第 1 章 (修订)", 1)
+        for label, text in (("cache cold", markdown), ("cache unchanged", markdown), ("cache 1 chapter edited", edited)):
+            start = time.perf_counter()
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                gen.convert_markdown_to_docx(text, os.path.join(tmp, "cached.docx"))
+            finally:
+                sys.stdout = stdout
+            print(f"  {label:<24} {time.perf_counter() - start:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/bench_import.py
+"""
+启动耗时基准：在全新的子进程中测量入口模块的导入时间，并检查是否加载了重依赖
+
+用法:
+    python benchmarks/bench_import.py                 # 只测当前工作区
+    python benchmarks/bench_import.py --ref baseline  # 同时对比某个 git 版本 (通过临时 worktree)
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = [
+    "chromadb", "langchain_chroma", "langchain_openai", "langchain_community", "langchain_core",
+    "duckduckgo_search", "bs4", "docx", "numpy", "tiktoken", "openai",
+]
+
+# 每个场景在独立进程中执行，输出 {"seconds": ..., "loaded": [...]}
+SCENARIOS = {
+    "import src.writer_agent": "import src.writer_agent",
+    "import app deps (writer_agent + doc_gen)": "import src.writer_agent, src.doc_gen",
+    "WriterAgent() + RAG 查询 (无 --files)": (
+        "import src.writer_agent as w\n"
+        "agent = w.WriterAgent(output_dir=os.path.join(tmp, 'task'))\n"
+        "agent.rag.query_knowledge_base('probe')"
+    ),
+}
+
+PROBE = """
+import os, sys, json, time, tempfile
+tmp = tempfile.mkdtemp()
+start = time.perf_counter()
+{code}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def run_probe(tree: str, code: str) -> dict:
+    env = dict(os.environ, SILICONFLOW_API_KEY=os.environ.get("SILICONFLOW_API_KEY", "bench-dummy-key"))
+    script = PROBE.format(code=code, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", script], cwd=tree, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure(tree: str, repeat: int) -> dict:
+    results = {}
+    for name, code in SCENARIOS.items():
+        runs = [run_probe(tree, code) for _ in range(repeat)]
+        results[name] = {
+            "median": statistics.median(r["seconds"] for r in runs),
+            "loaded": runs[-1]["loaded"],
+        }
+    # CLI 帮助信息的完整进程耗时 (含解释器启动)
+    runs = []
+    for _ in range(repeat):
+        script = "import subprocess, sys, time; s = time.perf_counter(); " \
+                 "subprocess.run([sys.executable, 'main.py', '--help'], capture_output=True); " \
+                 "print(time.perf_counter() - s)"
+        out = subprocess.run([sys.executable, "-c", script], cwd=tree, capture_output=True, text=True, check=True)
+        runs.append(float(out.stdout.strip()))
+    results["python main.py --help (wall)"] = {"median": statistics.median(runs), "loaded": None}
+    return results
+
+
+def print_results(label: str, results: dict):
+    print(f"\n== {label} ==")
+    for name, r in results.items():
+        loaded = "" if r["loaded"] is None else f"  重依赖: {', '.join(r['loaded']) or '无'}"
+        print(f"  {name:<42} {r['median'] * 1000:8.1f} ms{loaded}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--ref", help="对比的 git 版本 (如 baseline 提交号)")
+    args = parser.parse_args()
+
+    print_results("当前工作区", measure(ROOT, args.repeat))
+
+    if args.ref:
+        tmp = tempfile.mkdtemp()
+        tree = os.path.join(tmp, "tree")
+        subprocess.run(["git", "worktree", "add", "--detach", tree, args.ref], cwd=ROOT,
+                       check=True, capture_output=True)
+        try:
+            print_results(f"对比版本 {args.ref}", measure(tree, args.repeat))
+        except subprocess.CalledProcessError as e:
+            print(f"⚠️ 对比版本运行失败: {e.stderr.strip()[-300:]}")
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", tree], cwd=ROOT, capture_output=True)
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
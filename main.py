@@ -3,27 +3,39 @@
 import os
 import typer
 from tqdm import tqdm
-from src.writer_agent import WriterAgent
+from src.writer_agent import SHARED_VECTOR_DB, WriterAgent
 from src.doc_gen import DocumentGenerator
+from src.rag_engine import RAGEngine
 
 app = typer.Typer(add_completion=False)
 
 @app.command()
 def run(
     topic: str = typer.Option(..., "--topic", "-t"),
-    files_dir: str = typer.Option("./data", "--files", "-f"),
+    files_dir: str = typer.Option(None, "--files", "-f", help="RAG 资料目录；不指定时不加载任何向量检索组件"),
     output_dir: str = typer.Option("./output", "--out", "-o"),
 ):
     print(f"\n🚀 启动任务: {topic}")
     os.makedirs(output_dir, exist_ok=True)
     agent = WriterAgent(output_dir=output_dir)
     
-    if os.path.exists(files_dir) and os.listdir(files_dir):
+    if files_dir and os.path.exists(files_dir) and os.listdir(files_dir):
         print(f"\n📚 [Step 1] 学习资料...")
         agent.rag.ingest_data(files_dir)
+    elif not files_dir:
+        print("ℹ️ 未指定 --files，不使用本地资料 (旧版本默认读取 ./data)")
 
     print(f"\n🧠 [Step 2] 规划大纲...")
-    outline = agent.plan_outline(topic)
+    outline = []
+    # 流式规划：每解析出一章就立即后台预取搜索结果与配图，与后续大纲生成及写作重叠
+    for section in agent.iter_outline(topic):
+        outline.append(section)
+        agent.prefetch_section(topic, section, len(outline))
+        print(f"   {len(outline)}. {section['title']}")
+    if not outline:
+        print("❌ 大纲生成失败，请重试")
+        agent.close()
+        raise typer.Exit(code=1)
     
     print(f"\n✍️ [Step 3] 撰写与配图...")
     full_content = f"# {topic}\n\n"
@@ -35,6 +47,8 @@ def run(
             result = agent.write_single_section(topic, section, i+1)
             full_content += result["markdown"] # 只取 markdown 部分拼接
             pbar.update(1)
+    agent.close()
+    agent.llm.router.report()
 
     # 保存与生成 Word (保持不变)
     md_path = os.path.join(output_dir, "final_article.md")
@@ -46,5 +60,46 @@ def run(
     gen.convert_markdown_to_docx(full_content, os.path.join(output_dir, "final_article.docx"))
     print(f"✅ 完成: {output_dir}")
 
+@app.command()
+def gc(
+    max_idle_days: float = typer.Option(30, "--max-idle-days", help="超过该天数未使用的命名空间将被回收"),
+    db_path: str = typer.Option(SHARED_VECTOR_DB, "--db"),
+):
+    """回收共享向量库中长期未使用的任务命名空间及其独占的文档切片"""
+    rag = RAGEngine(vector_db_path=db_path, namespace="__gc__")
+    rag.gc_namespaces(max_idle_days=max_idle_days)
+
+@app.command()
+def maintenance(
+    output_dir: str = typer.Option("./output", "--out", "-o"),
+    max_age_days: float = typer.Option(None, "--max-age-days", help="归档超过该天数的任务"),
+    max_tasks: int = typer.Option(None, "--max-tasks", help="只保留最新的 N 个任务"),
+    max_total_mb: float = typer.Option(None, "--max-total-mb", help="保留任务的总大小上限 (MB)"),
+    keep_docx: bool = typer.Option(True, "--keep-docx/--drop-docx",
+                                   help="归档时是否保留 Word 文件；--drop-docx 可省空间，但会丢失对 Word 的手工修改"),
+    db_path: str = typer.Option(SHARED_VECTOR_DB, "--db"),
+    web_kb_path: str = typer.Option("./output/web_kb", "--web-kb", help="互联网知识库目录，过期切片会被清理"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="只列出将被归档的任务"),
+):
+    """清理过期的互联网知识，按保留策略把旧任务归档到 output/archive/tasks.zip，回收其向量库命名空间并重建任务索引"""
+    from src.maintenance import enforce_retention, rebuild_task_index
+
+    if not dry_run and os.path.exists(web_kb_path):
+        rag = RAGEngine(namespace="__maintenance__", web_kb_path=web_kb_path)
+        print(f"🧹 清理过期互联网知识切片 {rag.prune_web_knowledge()} 个")
+
+    if max_age_days is None and max_tasks is None and max_total_mb is None:
+        rebuild_task_index(output_dir)
+        print("ℹ️ 未指定保留策略，仅重建任务索引")
+        return
+    report = enforce_retention(output_dir, max_age_days=max_age_days, max_tasks=max_tasks,
+                               max_total_mb=max_total_mb, vector_db_path=db_path,
+                               keep_docx=keep_docx, dry_run=dry_run)
+    if dry_run:
+        print(f"🔍 共 {len(report['archived'])} 个任务将被归档")
+    else:
+        print(f"🧹 归档任务 {len(report['archived'])} 个，释放 {report['freed_bytes'] / 2**20:.1f} MB，"
+              f"回收命名空间 {report['namespaces']} 个")
+
 if __name__ == "__main__":
     app()
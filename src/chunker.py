@@ -0,0 +1,91 @@
+# src/chunker.py
+
+import re
+import hashlib
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
+
+from langchain_core.documents import Document
+
+# Markdown 标题或 "第X章/节" 形式的中文标题，作为一级切分点
+HEADING_RE = re.compile(r'^(?:#{1,6}\s+\S.*|第[一二三四五六七八九十百千0-9]+[章节部分篇].*)$', re.M)
+
+# 句子边界：中文句末标点 (含紧随的引号/括号)、英文句号后接空白、换行
+SENTENCE_END_RE = re.compile(r'[。！？；!?]+[”’"」』）)]*|\.(?=\s)|\n+')
+
+
+def _split_sections(text: str) -> List[Tuple[int, int]]:
+    """按标题切分，返回 [(start, end)]，标题归属其后的正文"""
+    starts = [m.start() for m in HEADING_RE.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    ends = starts[1:] + [len(text)]
+    return [(s, e) for s, e in zip(starts, ends) if text[s:e].strip()]
+
+
+def _split_sentences(text: str, start: int, end: int, max_len: int) -> Iterator[Tuple[int, int]]:
+    """在 [start, end) 范围内按句子边界切分；超长句子按 max_len 硬切"""
+    pos = start
+    for m in SENTENCE_END_RE.finditer(text, start, end):
+        yield from _hard_split(pos, m.end(), max_len)
+        pos = m.end()
+    if pos < end:
+        yield from _hard_split(pos, end, max_len)
+
+
+def _hard_split(start: int, end: int, max_len: int) -> Iterator[Tuple[int, int]]:
+    while end - start > max_len:
+        yield start, start + max_len
+        start += max_len
+    if end > start:
+        yield start, end
+
+
+def chunk_document(doc: Document, chunk_size: int = 800, chunk_overlap: int = 100) -> Iterator[Document]:
+    """
+    结构感知切片：先按标题分节，再在节内按句子边界装箱。
+    每个切片带稳定 ID 与原文偏移 (start/end)，重复导入同一文件会得到相同 ID
+    """
+    text = doc.page_content
+    # 共享库中以文件内容哈希作为 ID 前缀，同一文件不论上传路径都得到相同 ID
+    source = doc.metadata.get("file_hash") or doc.metadata.get("source", "")
+    page = doc.metadata.get("page", 0)
+    index = 0
+
+    for sec_start, sec_end in _split_sections(text):
+        window: List[Tuple[int, int]] = []
+        for sent in _split_sentences(text, sec_start, sec_end, chunk_size):
+            if window and sent[1] - window[0][0] > chunk_size:
+                yield _make_chunk(doc, text, window, source, page, index)
+                index += 1
+                # 保留末尾若干句作为重叠，保证语义连续
+                while window and (window[-1][1] - window[0][0] > chunk_overlap or sent[1] - window[0][0] > chunk_size):
+                    window.pop(0)
+            window.append(sent)
+        if window:
+            yield _make_chunk(doc, text, window, source, page, index)
+            index += 1
+
+
+def _make_chunk(doc: Document, text: str, window: List[Tuple[int, int]], source, page, index) -> Document:
+    start, end = window[0][0], window[-1][1]
+    content = text[start:end].strip()
+    digest = hashlib.sha1(f"{source}:{page}:{start}:{end}:{content}".encode("utf-8")).hexdigest()
+    metadata = dict(doc.metadata)
+    metadata.update({"chunk_id": digest, "chunk_index": index, "start": start, "end": end})
+    return Document(page_content=content, metadata=metadata)
+
+
+def iter_chunks(docs: Iterable[Document], chunk_size: int = 800, chunk_overlap: int = 100) -> Iterator[Document]:
+    """惰性消费文档流，逐个产出切片"""
+    for doc in docs:
+        for chunk in chunk_document(doc, chunk_size, chunk_overlap):
+            if chunk.page_content:
+                yield chunk
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """把流切成固定大小的批次 (最后一批可能不足)"""
+    it = iter(iterable)
+    while batch := list(islice(it, size)):
+        yield batch
@@ -0,0 +1,224 @@
+# src/context_builder.py
+
+import math
+import re
+import zlib
+import logging
+import threading
+from collections import Counter
+from typing import List, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 可选依赖：安装 tiktoken 时使用真实分词器计数，否则退化为中英文混合估算
+# (首次计数时才加载，避免拖慢启动)
+_ENCODING = None
+_ENCODING_LOADED = False
+_ENCODING_LOCK = threading.Lock()
+
+# tiktoken 本地没有缓存编码文件时会去 openaipublic 下载 (无超时)，
+# 超过该时间仍未加载完成就改用估算，不阻塞写作流程
+ENCODING_LOAD_TIMEOUT = 3.0
+
+
+def _load_encoding():
+    import tiktoken
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def _get_encoding():
+    global _ENCODING, _ENCODING_LOADED
+    with _ENCODING_LOCK:
+        if _ENCODING_LOADED:
+            return _ENCODING
+        result = {}
+
+        def load():
+            try:
+                result["encoding"] = _load_encoding()
+            except Exception:
+                pass
+
+        # 后台线程加载：超时后线程继续下载，下次启动即可命中本地缓存
+        loader = threading.Thread(target=load, daemon=True)
+        loader.start()
+        loader.join(ENCODING_LOAD_TIMEOUT)
+        _ENCODING = result.get("encoding")
+        if _ENCODING is None:
+            logger.info("tiktoken 编码未能在 %.0f 秒内加载，改用估算计数", ENCODING_LOAD_TIMEOUT)
+        _ENCODING_LOADED = True
+    return _ENCODING
+
+_CJK_RE = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]')
+_WORD_RE = re.compile(r'[A-Za-z0-9_]+')
+_NORMALIZE_RE = re.compile(r'[^\w\u3400-\u9fff]+')
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def count_tokens(text: str) -> int:
+    """本地 token 计数 (不走网络)"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # 估算：每个汉字约 1 token，每个英文单词约 1.3 token，标点另计
+    cjk = len(_CJK_RE.findall(text))
+    words = len(_WORD_RE.findall(text))
+    others = len(re.findall(r'[^\w\s\u3400-\u9fff]', text))
+    return cjk + math.ceil(words * 1.3) + others // 2
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """截断文本，使其 token 数不超过 max_tokens"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text)[:max_tokens])
+    # 二分查找最长的合规前缀
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo]
+
+
+def _normalize(text: str) -> str:
+    return _NORMALIZE_RE.sub(' ', text.lower()).strip()
+
+
+def _bigrams(text: str) -> Counter:
+    """字符二元组：对中文无需分词即可衡量相关性"""
+    text = _normalize(text).replace(' ', '')
+    return Counter(text[i:i + 2] for i in range(len(text) - 1))
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    if not a or not b:
+        return 0.0
+    dot = sum(v * b[k] for k, v in a.items() if k in b)
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+
+class MinHasher:
+    """基于字符 shingle 的 MinHash，用于识别近似重复的片段"""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 42):
+        self.shingle_size = shingle_size
+        # 线性同余哈希族 h(x) = (a*x + b) mod p，参数由固定种子生成，保证结果可复现
+        state = seed
+        self._params = []
+        for _ in range(num_perm):
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            a = (state >> 3) % (_MERSENNE_PRIME - 1) + 1
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            b = (state >> 3) % _MERSENNE_PRIME
+            self._params.append((a, b))
+
+    def shingles(self, text: str) -> set:
+        text = _normalize(text).replace(' ', '')
+        k = self.shingle_size
+        if len(text) <= k:
+            return {text} if text else set()
+        return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in self.shingles(text)]
+        if not hashes:
+            return ()
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._params)
+
+    @staticmethod
+    def similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+        """估算 Jaccard 相似度"""
+        if not sig_a or not sig_b:
+            return 0.0
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+class ContextBuilder:
+    """
+    写作上下文组装：联合重排 -> 近似去重 -> 按 token 预算装箱
+    本地 RAG 片段与互联网结果在同一尺度上与章节描述比较相关性
+    """
+
+    def __init__(self, token_budget: int = 1800, max_item_tokens: int = 400,
+                 dedup_threshold: float = 0.8, local_boost: float = 0.1):
+        self.token_budget = token_budget
+        self.max_item_tokens = max_item_tokens
+        self.dedup_threshold = dedup_threshold
+        # 本地资料优先级更高，相关性相近时优先选择
+        self.local_boost = local_boost
+        self.hasher = MinHasher()
+
+    def build(self, query: str, rag_texts: List[str], web_results: List[Dict]) -> Tuple[str, List[str], List[Dict]]:
+        """
+        :return: (上下文字符串, 入选的本地片段, 入选的互联网结果)
+        """
+        candidates = [{"kind": "local", "text": t, "item": t} for t in rag_texts if t and t.strip()]
+        candidates += [{"kind": "web", "text": w.get('body', ''), "item": w} for w in web_results if w.get('body')]
+
+        candidates = self._rerank(query, candidates)
+        candidates = self._deduplicate(candidates)
+        selected = self._pack(candidates)
+
+        local = [c for c in selected if c["kind"] == "local"]
+        web = [c for c in selected if c["kind"] == "web"]
+
+        context_parts = []
+        if local:
+            context_parts.append("【本地文件资料 (Priority High)】：")
+            for idx, c in enumerate(local):
+                context_parts.append(f"[Local-{idx+1}] {c['packed']}")
+        if web:
+            context_parts.append("【互联网最新资讯 (Priority Medium)】：")
+            for c in web:
+                w = c["item"]
+                context_parts.append(f"来源: [{w['title']}]({w['href']})\n内容摘要: {c['packed']}")
+
+        logger.info(f"上下文组装: 候选 {len(rag_texts) + len(web_results)} 条 -> 入选 {len(selected)} 条")
+        return "\n\n".join(context_parts), [c["item"] for c in local], [c["item"] for c in web]
+
+    def _rerank(self, query: str, candidates: List[Dict]) -> List[Dict]:
+        query_vec = _bigrams(query)
+        for c in candidates:
+            score = _cosine(query_vec, _bigrams(c["text"]))
+            if c["kind"] == "local":
+                score += self.local_boost
+            c["score"] = score
+        return sorted(candidates, key=lambda c: c["score"], reverse=True)
+
+    def _deduplicate(self, candidates: List[Dict]) -> List[Dict]:
+        """按得分从高到低保留，丢弃与已保留片段近似重复的候选"""
+        kept, signatures = [], []
+        for c in candidates:
+            sig = self.hasher.signature(c["text"])
+            if any(MinHasher.similarity(sig, s) >= self.dedup_threshold for s in signatures):
+                continue
+            kept.append(c)
+            signatures.append(sig)
+        return kept
+
+    def _pack(self, candidates: List[Dict]) -> List[Dict]:
+        remaining = self.token_budget
+        selected = []
+        for c in candidates:
+            # 单条上限 + 剩余预算，双重约束
+            limit = min(self.max_item_tokens, remaining)
+            if limit < 32:
+                break
+            text = truncate_to_tokens(c["text"].strip(), limit)
+            if len(text) < len(c["text"].strip()):
+                text += "..."
+            c["packed"] = text
+            remaining -= count_tokens(text)
+            selected.append(c)
+        return selected
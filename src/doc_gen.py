@@ -2,14 +2,167 @@
 
 import os
 import re
-from docx import Document
-from docx.shared import Inches, Pt, RGBColor
-from docx.oxml.ns import qn
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+import json
+import shutil
+import hashlib
+import zipfile
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+# python-docx 只在导出时才需要，相关导入放在各方法内部，避免拖慢 CLI / Web UI 启动
+
+# 章节数达到该值时才启用多进程渲染 (进程启动与片段合并有固定开销)
+MIN_SECTIONS_FOR_POOL = 8
+
+# 渲染结果缓存目录；渲染逻辑变化时递增版本号，使旧缓存失效
+DEFAULT_CACHE_DIR = "./output/docx_cache"
+RENDER_CACHE_VERSION = 1
+
+
+def split_sections(markdown_text: str) -> List[List[str]]:
+    """按一级 / 二级标题把 Markdown 切成章节，每章为一组行；首个标题之前的内容单独成组"""
+    sections: List[List[str]] = [[]]
+    for line in markdown_text.split('\n'):
+        stripped = line.strip()
+        if (stripped.startswith('# ') or stripped.startswith('## ')) and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+    return [sec for sec in sections if any(l.strip() for l in sec)]
+
+
+def _render_fragment(lines: List[str], base_dir: str) -> Tuple[bytes, Dict[str, bytes]]:
+    """
+    工作进程入口：把一组行渲染为独立的文档片段 (含图片读取与尺寸计算)
+    :return: (正文 body 的 XML, {片段内图片 rId: 图片字节})；不经过 docx 打包，省去压缩与解压
+    """
+    from docx.parts.image import ImagePart
+    from lxml import etree
+
+    gen = DocumentGenerator(max_workers=1, cache_dir=None)
+    doc = gen._new_document()
+    gen._render_lines(doc, lines, base_dir)
+    images = {r_id: part.blob for r_id, part in doc.part.related_parts.items()
+              if isinstance(part, ImagePart)}
+    return etree.tostring(doc.element.body), images
+
+
+class RenderCache:
+    """
+    Word 导出的磁盘缓存 (按内容哈希寻址)
+    - documents/<key>.docx: 整篇文档，Markdown 与图片都未变化时直接复制
+    - fragments/<key>.zip: 单章片段 (正文 XML + 图片引用)，只改了部分章节时复用其余章节
+    - images/<sha256>: 片段引用的图片，多个片段共用同一份
+    总大小超过 max_mb 时按最近使用时间淘汰
+    """
+
+    def __init__(self, cache_dir: str, max_mb: float = 512):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 2**20
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+
+    def _path(self, kind: str, key: str, ext: str) -> str:
+        return os.path.join(self.cache_dir, kind, f"{key}{ext}")
+
+    def file_digest(self, path: str) -> str:
+        """图片内容哈希，按 (路径, 大小, mtime) 在进程内记忆，同一文件不重复读取"""
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self._digests:
+            with open(path, "rb") as f:
+                self._digests[memo_key] = hashlib.sha256(f.read()).hexdigest()
+        return self._digests[memo_key]
+
+    @staticmethod
+    def _touch(path: str):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def load_fragment(self, key: str) -> Optional[Tuple[bytes, Dict[str, bytes]]]:
+        path = self._path("fragments", key, ".zip")
+        try:
+            with zipfile.ZipFile(path) as zf:
+                body_xml = zf.read("body.xml")
+                refs = json.loads(zf.read("images.json"))
+            images = {}
+            for r_id, digest in refs.items():
+                with open(self._path("images", digest, ""), "rb") as f:
+                    images[r_id] = f.read()
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            return None
+        self._touch(path)
+        return body_xml, images
+
+    def store_fragment(self, key: str, fragment: Tuple[bytes, Dict[str, bytes]]):
+        """片段只记录图片的内容哈希，图片本身在 images/ 下按哈希只存一份"""
+        body_xml, images = fragment
+        refs = {}
+        for r_id, blob in images.items():
+            digest = hashlib.sha256(blob).hexdigest()
+            image_path = self._path("images", digest, "")
+            if not os.path.exists(image_path):
+                self._write_atomic(image_path, blob)
+            refs[r_id] = digest
+
+        buf = BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("body.xml", body_xml)
+            zf.writestr("images.json", json.dumps(refs))
+        self._write_atomic(self._path("fragments", key, ".zip"), buf.getvalue())
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def restore_document(self, key: str, output_path: str) -> bool:
+        path = self._path("documents", key, ".docx")
+        if not os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        shutil.copyfile(path, output_path)
+        self._touch(path)
+        return True
+
+    def store_document(self, key: str, docx_path: str):
+        path = self._path("documents", key, ".docx")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.copyfile(docx_path, tmp_path)
+        os.replace(tmp_path, path)
+        self.prune()
+
+    def prune(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+
 
 class DocumentGenerator:
-    def __init__(self):
-        pass
+    def __init__(self, max_workers: Optional[int] = None, cache_dir: Optional[str] = DEFAULT_CACHE_DIR):
+        # 长文档按章节在多个进程中并行渲染，最后按顺序合并 (1 表示始终串行)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # 渲染结果缓存 (None 表示不缓存)：未改动的文章 / 章节无需重新渲染
+        self.cache = RenderCache(cache_dir) if cache_dir else None
 
     def convert_markdown_to_docx(self, markdown_text: str, output_path: str):
         """
@@ -17,16 +170,117 @@ class DocumentGenerator:
         1. 自动去除行首空格（解决解析失败问题）
         2. 正确渲染 **加粗** 文字
         3. 智能寻找图片路径
+        4. 章节较多时按章节并行渲染
+        5. 按内容哈希缓存整篇文档与单章片段
         """
-        doc = Document()
-        self._set_global_style(doc)
-
         # 获取文档所在的基准目录 (例如 ./output)
         base_dir = os.path.dirname(os.path.abspath(output_path))
         print(f"📂 文档基准路径: {base_dir}")
 
-        lines = markdown_text.split('\n')
-        
+        sections = split_sections(markdown_text)
+        doc_key = None
+        if self.cache is not None:
+            keys = [self._section_key(sec, base_dir) for sec in sections]
+            doc_key = hashlib.sha256("\n".join([f"v{RENDER_CACHE_VERSION}"] + keys).encode("utf-8")).hexdigest()
+            if self.cache.restore_document(doc_key, output_path):
+                print(f"✅ Word 文档未变化，直接使用缓存: {output_path}")
+                return
+            doc = self._merge_fragments(self._render_with_cache(sections, keys, base_dir))
+        elif self.max_workers > 1 and len(sections) >= MIN_SECTIONS_FOR_POOL:
+            doc = self._merge_fragments(self._render_parallel(sections, base_dir))
+        else:
+            doc = self._new_document()
+            self._render_lines(doc, markdown_text.split('\n'), base_dir)
+
+        # 保存
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        try:
+            doc.save(output_path)
+            print(f"✅ Word 文档生成成功: {output_path}")
+        except Exception as e:
+            print(f"❌ 无法保存文件 (可能文件被占用): {e}")
+            return
+        if doc_key is not None:
+            self.cache.store_document(doc_key, output_path)
+
+    def _section_key(self, lines: List[str], base_dir: str) -> str:
+        """章节缓存键：原文 + 引用图片的内容哈希 (图片缺失时记为 missing)"""
+        h = hashlib.sha256(f"v{RENDER_CACHE_VERSION}\n".encode("utf-8"))
+        for line in lines:
+            h.update(line.strip().encode("utf-8") + b"\n")
+            stripped = line.strip()
+            if stripped.startswith('![') and '](' in stripped:
+                located = self._locate_image(stripped, base_dir)
+                if located is not None:
+                    final_path = located[1]
+                    h.update((self.cache.file_digest(final_path) if final_path else "missing").encode("utf-8"))
+        return h.hexdigest()
+
+    def _render_with_cache(self, sections: List[List[str]], keys: List[str], base_dir: str):
+        """优先复用缓存的章节片段，只渲染有变化的章节"""
+        fragments = [self.cache.load_fragment(key) for key in keys]
+        missing = [i for i, fragment in enumerate(fragments) if fragment is None]
+        if missing:
+            todo = [sections[i] for i in missing]
+            if self.max_workers > 1 and len(todo) >= MIN_SECTIONS_FOR_POOL:
+                rendered = self._render_parallel(todo, base_dir)
+            else:
+                rendered = [_render_fragment(sec, base_dir) for sec in todo]
+            for i, fragment in zip(missing, rendered):
+                fragments[i] = fragment
+                self.cache.store_fragment(keys[i], fragment)
+        print(f"♻️ 复用缓存章节 {len(sections) - len(missing)} 个，重新渲染 {len(missing)} 个")
+        return fragments
+
+    def _new_document(self):
+        from docx import Document
+
+        doc = Document()
+        self._set_global_style(doc)
+        return doc
+
+    def _render_parallel(self, sections: List[List[str]], base_dir: str):
+        """各章节在工作进程中渲染为文档片段，按原顺序返回"""
+        from concurrent.futures import ProcessPoolExecutor
+
+        workers = min(self.max_workers, len(sections))
+        print(f"⚡ 并行渲染 {len(sections)} 个章节 ({workers} 个进程)")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_render_fragment, sections, [base_dir] * len(sections)))
+
+    def _merge_fragments(self, fragments: List[Tuple[bytes, Dict[str, bytes]]]):
+        """
+        按顺序把片段正文追加到新文档：图片按内容哈希登记到主文档 (同一图片只存一份)，
+        并改写图片引用的 rId、重新编号 drawing id
+        """
+        from docx.oxml import parse_xml
+        from docx.oxml.ns import qn
+
+        doc = self._new_document()
+        body = doc.element.body
+        sect_pr = body.find(qn('w:sectPr'))
+        image_ids: Dict[str, str] = {}
+
+        for body_xml, images in fragments:
+            for element in list(parse_xml(body_xml).iterchildren()):
+                if element.tag == qn('w:sectPr'):
+                    continue
+                for blip in element.iter(qn('a:blip')):
+                    blob = images.get(blip.get(qn('r:embed')))
+                    if blob is None:
+                        continue
+                    digest = hashlib.sha1(blob).hexdigest()
+                    if digest not in image_ids:
+                        image_ids[digest], _ = doc.part.get_or_add_image(BytesIO(blob))
+                    blip.set(qn('r:embed'), image_ids[digest])
+                sect_pr.addprevious(element)
+
+        # 各片段的 drawing id 都从 1 开始，合并后需全局唯一
+        for i, doc_pr in enumerate(body.iter(qn('wp:docPr')), start=1):
+            doc_pr.set('id', str(i))
+        return doc
+
+    def _render_lines(self, doc, lines: List[str], base_dir: str):
         for line in lines:
             # 关键修复 1: 去除首尾空格，防止 "  ## 标题" 识别失败
             stripped_line = line.strip()
@@ -65,16 +319,11 @@ class DocumentGenerator:
                 # 关键修复 2: 调用富文本渲染，处理 **加粗**
                 self._render_rich_text(p, stripped_line)
 
-        # 保存
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        try:
-            doc.save(output_path)
-            print(f"✅ Word 文档生成成功: {output_path}")
-        except Exception as e:
-            print(f"❌ 无法保存文件 (可能文件被占用): {e}")
-
     def _set_global_style(self, doc):
         """设置中西文混合字体"""
+        from docx.oxml.ns import qn
+        from docx.shared import Pt
+
         try:
             style = doc.styles['Normal']
             font = style.font
@@ -85,6 +334,9 @@ class DocumentGenerator:
             pass
 
     def _add_heading(self, doc, text, level):
+        from docx.oxml.ns import qn
+        from docx.shared import RGBColor
+
         # 同样支持标题中的加粗渲染
         heading = doc.add_heading(level=level)
         self._render_rich_text(heading, text)
@@ -99,6 +351,8 @@ class DocumentGenerator:
         """
         解析 Markdown 的 **加粗** 语法并应用到 Word 段落
         """
+        from docx.oxml.ns import qn
+
         # 正则拆分: (非加粗部分, 加粗部分, 非加粗部分...)
         # pattern matching **text**
         parts = re.split(r'(\*\*.*?\*\*)', text)
@@ -117,14 +371,16 @@ class DocumentGenerator:
                     run.font.name = 'Times New Roman'
                     run._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
 
-    def _add_image(self, doc, line, base_dir):
+    @staticmethod
+    def _locate_image(line, base_dir):
         """
         更加智能的路径查找逻辑
+        :return: (Markdown 中的原始路径, 找到的文件路径或 None, 尝试过的路径)；不是图片行时返回 None
         """
         # 提取路径
         match = re.search(r'\!\[.*?\]\((.*?)\)', line)
         if not match:
-            return
+            return None
             
         raw_path = match.group(1).strip()
         
@@ -155,12 +411,23 @@ class DocumentGenerator:
             if os.path.exists(p) and os.path.isfile(p):
                 final_path = p
                 break
+        return raw_path, final_path, candidates
+
+    def _add_image(self, doc, line, base_dir):
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+        from docx.shared import Inches, RGBColor
+
+        located = self._locate_image(line, base_dir)
+        if located is None:
+            return
+        raw_path, final_path, candidates = located
         
         if final_path:
             try:
                 # 插入图片
-                doc.add_picture(final_path, width=Inches(6.0))
-                last_p = doc.paragraphs[-1]
+                # 直接持有新段落，避免 doc.paragraphs[-1] 每次遍历全文 (长文档下为平方复杂度)
+                last_p = doc.add_paragraph()
+                last_p.add_run().add_picture(final_path, width=Inches(6.0))
                 last_p.alignment = WD_ALIGN_PARAGRAPH.CENTER
                 print(f"  🖼️  图片插入成功: {os.path.basename(final_path)}")
             except Exception as e:
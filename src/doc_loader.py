@@ -0,0 +1,127 @@
+# src/doc_loader.py
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+from typing import Iterator, List, Tuple, Dict, Optional
+
+from langchain_core.documents import Document
+
+# 扩展名 -> 解析函数名 (在子进程中按名字分派，保证可 pickle)
+SUPPORTED_EXTENSIONS = {
+    ".txt": "_load_text",
+    ".md": "_load_text",
+    ".pdf": "_load_pdf",
+    ".docx": "_load_docx",
+}
+
+# 文件数少于该值时直接在当前进程加载，省去进程池启动开销
+MIN_FILES_FOR_POOL = 4
+
+
+def discover_files(data_dir: str) -> List[str]:
+    """递归列出目录下所有支持格式的文件"""
+    paths = []
+    for root, _, files in os.walk(data_dir):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def _load_text(path: str) -> List[Tuple[str, Dict]]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    # 中文资料常见 GBK 编码，UTF-8 失败时再尝试
+    for encoding in ("utf-8", "gbk"):
+        try:
+            return [(raw.decode(encoding), {})]
+        except UnicodeDecodeError:
+            continue
+    return [(raw.decode("utf-8", errors="replace"), {})]
+
+
+def _load_pdf(path: str) -> List[Tuple[str, Dict]]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    pages = []
+    for idx, page in enumerate(reader.pages):
+        text = page.extract_text() or ""
+        if text.strip():
+            pages.append((text, {"page": idx + 1}))
+    return pages
+
+
+def _load_docx(path: str) -> List[Tuple[str, Dict]]:
+    from docx import Document as DocxDocument
+
+    doc = DocxDocument(path)
+    text = "\n".join(p.text for p in doc.paragraphs if p.text.strip())
+    return [(text, {})]
+
+
+def _load_file(path: str) -> Tuple[str, List[Tuple[str, Dict]], float, Optional[str]]:
+    """子进程入口：返回 (路径, [(页文本, 元数据)], 耗时, 错误信息)"""
+    start = time.perf_counter()
+    try:
+        loader = globals()[SUPPORTED_EXTENSIONS[os.path.splitext(path)[1].lower()]]
+        return path, loader(path), time.perf_counter() - start, None
+    except Exception as e:
+        return path, [], time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+
+class LoadReport:
+    """记录每个文件的加载耗时与失败原因"""
+
+    def __init__(self):
+        self.records = []
+
+    def add(self, path: str, pages: int, seconds: float, error: Optional[str]):
+        self.records.append({"path": path, "pages": pages, "seconds": seconds, "error": error})
+
+    @property
+    def failures(self) -> List[Dict]:
+        return [r for r in self.records if r["error"]]
+
+    def summary(self) -> str:
+        ok = len(self.records) - len(self.failures)
+        total = sum(r["seconds"] for r in self.records)
+        lines = [f"   -> 加载 {ok}/{len(self.records)} 个文件，累计解析耗时 {total:.2f}s"]
+        for r in sorted(self.records, key=lambda r: r["seconds"], reverse=True)[:5]:
+            if not r["error"]:
+                lines.append(f"      {os.path.basename(r['path'])}: {r['pages']} 页, {r['seconds']:.2f}s")
+        for r in self.failures:
+            lines.append(f"      ❌ {os.path.basename(r['path'])}: {r['error']}")
+        return "\n".join(lines)
+
+
+def iter_documents(paths: List[str], max_workers: Optional[int] = None,
+                   report: Optional[LoadReport] = None) -> Iterator[Document]:
+    """
+    按文件类型分派解析，多进程并行；每个文件解析完成即逐页产出 Document，
+    下游切片无需等待全部文件加载完毕
+    """
+    def emit(path, pages, seconds, error):
+        if report is not None:
+            report.add(path, len(pages), seconds, error)
+        for text, meta in pages:
+            yield Document(page_content=text, metadata={"source": path, **meta})
+
+    if len(paths) < MIN_FILES_FOR_POOL:
+        for path in paths:
+            yield from emit(*_load_file(path))
+        return
+
+    max_workers = max_workers or os.cpu_count() or 1
+    pending_paths = iter(paths)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        # 限制在途任务数，避免解析结果在内存中堆积
+        in_flight = {pool.submit(_load_file, p) for p in islice(pending_paths, max_workers * 2)}
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from emit(*future.result())
+                for p in islice(pending_paths, 1):
+                    in_flight.add(pool.submit(_load_file, p))
@@ -0,0 +1,208 @@
+# src/json_stream.py
+
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+FENCE_RE = re.compile(r"```[a-zA-Z]*")
+
+
+def repair_json(text: str) -> str:
+    """
+    修复 LLM 输出中常见的 JSON 缺陷，返回可交给 json.loads 的字符串
+    - Markdown 代码块标记、JSON 前后的说明文字
+    - 对象 / 数组末尾多余的逗号
+    - 输出被截断：补全未闭合的字符串、悬空的键，并按嵌套顺序补齐括号
+    """
+    text = FENCE_RE.sub("", text or "")
+    starts = [i for i in (text.find("["), text.find("{")) if i >= 0]
+    if not starts:
+        return text.strip()
+    text = text[min(starts):]
+
+    out: List[str] = []
+    stack: List[str] = []
+    in_string = escape = False
+    expect_key = False      # 当前位置是否为对象的键
+    string_is_key = False
+
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+            string_is_key = expect_key
+            expect_key = False
+            out.append(ch)
+        elif ch in "[{":
+            stack.append(ch)
+            expect_key = ch == "{"
+            out.append(ch)
+        elif ch in "]}":
+            _strip_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                # 根节点闭合，丢弃之后的说明文字
+                return "".join(out)
+        elif ch == ",":
+            expect_key = bool(stack) and stack[-1] == "{"
+            out.append(ch)
+        else:
+            out.append(ch)
+
+    # 以下处理截断的输出
+    if in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+        if string_is_key:
+            out.append(": null")
+    tail = "".join(out).rstrip()
+    if tail.endswith(":"):
+        tail += " null"
+    out = [tail]
+    _strip_trailing_comma(out)
+    for opener in reversed(stack):
+        out.append("}" if opener == "{" else "]")
+    return "".join(out)
+
+
+def _strip_trailing_comma(out: List[str]):
+    text = "".join(out).rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    out[:] = [text]
+
+
+def loads_tolerant(text: str) -> Any:
+    """先按标准 JSON 解析，失败后修复再解析；仍失败时抛出 json.JSONDecodeError"""
+    try:
+        return json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        return json.loads(repair_json(text))
+
+
+def validate(obj: Any, schema: Dict[str, type], required: Iterable[str] = ()) -> Optional[Dict]:
+    """
+    按 {字段: 类型} 的简单 schema 校验并清洗对象
+    必填字段缺失或为空时返回 None；可选字段类型不符时直接丢弃
+    """
+    if not isinstance(obj, dict):
+        return None
+    clean = {}
+    for key, expected in schema.items():
+        if key not in obj or obj[key] is None:
+            continue
+        value = obj[key]
+        if expected is str and isinstance(value, (int, float)):
+            value = str(value)
+        if isinstance(value, expected):
+            clean[key] = value.strip() if isinstance(value, str) else value
+    for key in required:
+        if not clean.get(key):
+            return None
+    # 保留 schema 之外的字段，交由调用方决定是否使用
+    for key, value in obj.items():
+        if key not in schema:
+            clean[key] = value
+    return clean
+
+
+class IncrementalJSONParser:
+    """
+    流式 JSON 解析器：逐块 feed 模型输出，每当一个顶层条目对象闭合就立即产出，
+    无需等待整个 JSON 生成完毕
+
+    顶层条目兼容以下几种大纲形态：
+      [ {...}, {...} ]                  -- 根数组中的对象
+      {"chapters": [ {...}, {...} ]}    -- 根对象下第一层数组中的对象
+      {"0": {...}, "1": {...}}          -- 根对象的直接子对象
+    条目内部嵌套的对象 (如子章节) 不会单独产出
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._starts: List[int] = []
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._done = False
+
+    def feed(self, chunk: str) -> List[Any]:
+        items = []
+        if self._done or not chunk:
+            return items
+        self._text += chunk
+        text = self._text
+
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if not self._started:
+                # 跳过代码块标记和 JSON 之前的说明文字
+                if ch not in "[{":
+                    continue
+                self._started = True
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                self._stack.append(ch)
+                self._starts.append(i)
+            elif ch in "]}":
+                if not self._stack:
+                    continue
+                opener = self._stack.pop()
+                start = self._starts.pop()
+                if opener == "{" and self._is_item_level():
+                    item = self._parse(text[start:i + 1])
+                    if item is not None:
+                        items.append(item)
+                if not self._stack:
+                    self._done = True
+                    break
+        self._pos = len(text)
+        return items
+
+    def finish(self) -> List[Any]:
+        """输出结束 (或被截断) 时调用：尝试修复并产出尚未闭合的最后一个条目"""
+        if self._done or not self._stack:
+            return []
+        text = self._text
+        for depth in range(len(self._stack)):
+            if self._stack[depth] == "{" and self._is_item_level(self._stack[:depth]):
+                item = self._parse(text[self._starts[depth]:])
+                return [item] if item is not None else []
+        return []
+
+    def _is_item_level(self, parents: Optional[List[str]] = None) -> bool:
+        parents = self._stack if parents is None else parents
+        return parents in (["["], ["{"], ["{", "["])
+
+    @staticmethod
+    def _parse(fragment: str) -> Optional[Any]:
+        try:
+            return loads_tolerant(fragment)
+        except json.JSONDecodeError:
+            return None
+
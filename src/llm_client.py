@@ -1,22 +1,261 @@
 # src/llm_client.py
 import os
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Dict, Iterator, List, Optional
 from dotenv import load_dotenv
-from openai import OpenAI
 
 # 加载 .env 环境变量
 load_dotenv()
 
+# 任务类型 -> 有序候选模型 (首选在前，后面的用于故障转移)
+# 提取搜索词 / 配图关键词这类短输出任务走小模型，规划与写作走大模型
+DEFAULT_MODEL_ROUTES = {
+    "plan": ["deepseek-ai/DeepSeek-V3", "Qwen/Qwen2.5-72B-Instruct"],
+    "write": ["Qwen/Qwen2.5-72B-Instruct", "deepseek-ai/DeepSeek-V3"],
+    "query_gen": ["Qwen/Qwen2.5-7B-Instruct", "Qwen/Qwen2.5-72B-Instruct"],
+    "keyword": ["Qwen/Qwen2.5-7B-Instruct", "Qwen/Qwen2.5-72B-Instruct"],
+}
+
+# 单次请求超时 (秒)：超时即视为失败并切换到下一个候选模型
+TASK_TIMEOUTS = {"plan": 120, "write": 120, "query_gen": 20, "keyword": 20}
+
+# 滚动 p95 延迟预算 (秒)：超出预算的模型会被排到预算内的模型之后
+TASK_LATENCY_BUDGETS = {"plan": 60, "write": 60, "query_gen": 8, "keyword": 8}
+
+# 对冲请求的延迟样本与调用计数，跨任务 / 跨进程保留
+DEFAULT_HEDGE_STATS_PATH = "./output/stats/hedge.json"
+
+
+class ModelStats:
+    """单个模型最近 window 次调用的延迟与成败记录"""
+
+    def __init__(self, window: int = 50):
+        self.calls = deque(maxlen=window)
+        self.consecutive_errors = 0
+        self.cooldown_until = 0.0
+
+    def record(self, latency: float, ok: bool):
+        self.calls.append((latency, ok, time.time()))
+        self.consecutive_errors = 0 if ok else self.consecutive_errors + 1
+
+    def recent(self, since: float = 0.0) -> List:
+        return [(lat, ok) for lat, ok, ts in self.calls if ts >= since]
+
+    @staticmethod
+    def percentile_of(calls: List, q: float) -> Optional[float]:
+        latencies = sorted(lat for lat, ok in calls if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    @staticmethod
+    def error_rate_of(calls: List) -> float:
+        if not calls:
+            return 0.0
+        return sum(1 for _, ok in calls if not ok) / len(calls)
+
+    def percentile(self, q: float) -> Optional[float]:
+        return self.percentile_of(self.recent(), q)
+
+    @property
+    def error_rate(self) -> float:
+        return self.error_rate_of(self.recent())
+
+
+class ModelRouter:
+    """
+    按任务类型选择模型：
+    - 路由表给出每类任务的有序候选模型
+    - 连续失败的模型进入冷却期；错误率或 p95 延迟超标的模型降级到候选列表末尾
+    - 降级模型仍保留为最后的兜底，不会因统计数据导致无模型可用
+    - 健康判断只看最近 stats_ttl 秒内的样本且至少 min_samples 个：降级后不再被调用的模型，
+      其旧样本过期后自动恢复原有顺序，不会被一次偶发的慢调用永久降级
+    """
+
+    def __init__(self, routes: Optional[Dict[str, List[str]]] = None, window: int = 50,
+                 max_error_rate: float = 0.5, min_samples: int = 5,
+                 max_consecutive_errors: int = 3, cooldown: float = 60.0, stats_ttl: float = 600.0):
+        self.routes = dict(DEFAULT_MODEL_ROUTES)
+        self.routes.update(routes or {})
+        self.window = window
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.max_consecutive_errors = max_consecutive_errors
+        self.cooldown = cooldown
+        self.stats_ttl = stats_ttl
+        self._stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def _get_stats(self, model: str) -> ModelStats:
+        if model not in self._stats:
+            self._stats[model] = ModelStats(self.window)
+        return self._stats[model]
+
+    def candidates(self, task: str) -> List[str]:
+        """返回本次调用的模型尝试顺序"""
+        if task not in self.routes:
+            raise ValueError(f"未知的任务类型: {task}")
+        budget = TASK_LATENCY_BUDGETS.get(task)
+        now = time.time()
+        preferred, demoted = [], []
+        with self._lock:
+            for model in self.routes[task]:
+                stats = self._get_stats(model)
+                recent = stats.recent(now - self.stats_ttl)
+                enough = len(recent) >= self.min_samples
+                p95 = ModelStats.percentile_of(recent, 0.95)
+                unhealthy = (
+                    stats.cooldown_until > now
+                    or (enough and ModelStats.error_rate_of(recent) > self.max_error_rate)
+                    or (enough and budget is not None and p95 is not None and p95 > budget)
+                )
+                (demoted if unhealthy else preferred).append(model)
+        return preferred + demoted
+
+    def record(self, model: str, latency: float, ok: bool):
+        with self._lock:
+            stats = self._get_stats(model)
+            stats.record(latency, ok)
+            if stats.consecutive_errors >= self.max_consecutive_errors:
+                stats.cooldown_until = time.time() + self.cooldown
+
+    def stats(self) -> Dict[str, Dict]:
+        """各模型的滚动统计：调用数、p50/p95 延迟 (秒)、错误率"""
+        with self._lock:
+            return {
+                model: {
+                    "calls": len(s.calls),
+                    "p50": s.percentile(0.5),
+                    "p95": s.percentile(0.95),
+                    "error_rate": s.error_rate,
+                }
+                for model, s in self._stats.items() if s.calls
+            }
+
+    def report(self):
+        for model, s in self.stats().items():
+            p50 = f"{s['p50']:.1f}s" if s['p50'] is not None else "-"
+            p95 = f"{s['p95']:.1f}s" if s['p95'] is not None else "-"
+            print(f"   📈 {model}: {s['calls']} 次, p50={p50}, p95={p95}, 错误率={s['error_rate']:.0%}")
+
+
+class HedgePolicy:
+    """
+    对冲请求策略：调用超过该任务近期延迟的 percentile 分位仍未返回时，再发一个副本请求，
+    先完成者胜出；对冲次数不超过总调用数的 max_hedge_ratio，避免成本翻倍
+    - 延迟样本与调用计数可持久化到 stats_path，并通过 shared() 在进程内的多个 WriterAgent 间共享，
+      否则每篇文章 5~8 次写作调用永远攒不够样本
+    - 样本不足 min_samples 时以该任务的静态延迟预算 (TASK_LATENCY_BUDGETS) 作为对冲阈值
+    """
+
+    _shared: Dict[str, "HedgePolicy"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, percentile: float = 0.95, min_samples: int = 10, max_hedge_ratio: float = 0.1,
+                 alternate_model: bool = True, window: int = 100, burst: int = 1,
+                 stats_path: Optional[str] = None):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        # 额度之外允许的对冲次数：调用数还很少时也能对冲首个卡住的请求
+        self.burst = burst
+        # 副本请求发往路由中的下一个候选模型 (False 时发往同一模型)
+        self.alternate_model = alternate_model
+        self.window = window
+        self.calls = 0
+        self.hedges = 0
+        self._latencies: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self.stats_path = stats_path
+        self._load()
+
+    @classmethod
+    def shared(cls, stats_path: str = DEFAULT_HEDGE_STATS_PATH, **kwargs) -> "HedgePolicy":
+        """按统计文件路径返回进程内共享的策略实例"""
+        key = os.path.abspath(stats_path)
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(stats_path=stats_path, **kwargs)
+            return cls._shared[key]
+
+    def _load(self):
+        if not self.stats_path:
+            return
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.calls = data.get("calls", 0)
+        self.hedges = data.get("hedges", 0)
+        for task, latencies in data.get("latencies", {}).items():
+            self._latencies[task] = deque(latencies, maxlen=self.window)
+
+    def _save(self):
+        if not self.stats_path:
+            return
+        with self._lock:
+            data = {
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "latencies": {task: list(lat) for task, lat in self._latencies.items()},
+            }
+        try:
+            os.makedirs(os.path.dirname(self.stats_path) or ".", exist_ok=True)
+            tmp_path = f"{self.stats_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.stats_path)
+        except OSError as e:
+            print(f"⚠️ 对冲统计写入失败: {e}")
+
+    def record(self, task: str, latency: float):
+        """记录单次请求 (而非对冲后) 的完成延迟，避免阈值被对冲结果逐步拉低"""
+        with self._lock:
+            self._latencies.setdefault(task, deque(maxlen=self.window)).append(latency)
+        self._save()
+
+    def delay(self, task: str) -> Optional[float]:
+        """触发对冲的等待时间；样本不足时使用静态延迟预算，未配置预算的任务返回 None (不对冲)"""
+        with self._lock:
+            latencies = sorted(self._latencies.get(task, ()))
+        if len(latencies) < self.min_samples:
+            return TASK_LATENCY_BUDGETS.get(task)
+        return latencies[min(len(latencies) - 1, int(self.percentile * len(latencies)))]
+
+    def start_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def try_acquire(self) -> bool:
+        """申请一次对冲额度"""
+        with self._lock:
+            if self.hedges + 1 > self.max_hedge_ratio * self.calls + self.burst:
+                return False
+            self.hedges += 1
+        self._save()
+        return True
+
+
 class LLMClient:
-    def __init__(self):
+    def __init__(self, routes: Optional[Dict[str, List[str]]] = None, hedge: Optional[HedgePolicy] = None):
         self.api_key = os.getenv("SILICONFLOW_API_KEY")
         if not self.api_key:
             raise ValueError("❌ 未找到 SILICONFLOW_API_KEY，请检查 .env 文件")
-        
-        # 初始化 OpenAI 客户端，指向硅基流动的地址
+
+        # 初始化 OpenAI 客户端，指向硅基流动的地址 (openai SDK 较重，构造时才导入)
+        from openai import OpenAI
         self.client = OpenAI(
             api_key=self.api_key,
             base_url="https://api.siliconflow.cn/v1"
         )
+        self.router = ModelRouter(routes)
+        # 可选：对冲请求 (默认关闭)
+        self.hedge = hedge
 
     def call_llm(self, prompt: str, model_name: str, json_mode: bool = False) -> str:
         """
@@ -24,7 +263,7 @@ class LLMClient:
         :param model_name: 例如 "deepseek-ai/DeepSeek-V3" 或 "Qwen/Qwen2.5-72B-Instruct"
         """
         messages = [{"role": "user", "content": prompt}]
-        
+
         try:
             response = self.client.chat.completions.create(
                 model=model_name,
@@ -38,3 +277,165 @@ class LLMClient:
         except Exception as e:
             print(f"❌ LLM 调用异常: {e}")
             return ""
+
+    def call_task(self, task: str, prompt: str, json_mode: bool = False) -> str:
+        """
+        按任务类型路由调用：依次尝试候选模型，失败、超时或空响应时自动切换到下一个
+        """
+        messages = [{"role": "user", "content": prompt}]
+        models = self.router.candidates(task)
+        if self.hedge is not None:
+            content, tried = self._call_hedged(task, messages, json_mode, models)
+            if content:
+                return content
+            models = [m for m in models if m not in tried]
+        for i, model in enumerate(models):
+            # 还有后备模型时不做 SDK 内部重试，直接故障转移
+            client = self.client.with_options(timeout=TASK_TIMEOUTS.get(task, 120),
+                                              max_retries=0 if i < len(models) - 1 else 1)
+            start = time.perf_counter()
+            try:
+                response = client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=0.7,
+                    response_format={"type": "json_object"} if json_mode else {"type": "text"},
+                    stream=False
+                )
+                content = response.choices[0].message.content or ""
+            except Exception as e:
+                self.router.record(model, time.perf_counter() - start, ok=False)
+                print(f"⚠️ 模型 {model} 调用失败 ({task}): {e}")
+                continue
+            self.router.record(model, time.perf_counter() - start, ok=bool(content.strip()))
+            if content.strip():
+                return content
+        print(f"❌ LLM 调用异常: 任务 {task} 的所有候选模型均失败")
+        return ""
+
+    def _call_hedged(self, task: str, messages: List[Dict], json_mode: bool, models: List[str]):
+        """
+        对冲调用：主请求超过延迟阈值仍未返回时发出副本请求，先得到非空结果者胜出，
+        其余请求通过取消标志在下一个文本块到达时关闭连接
+        :return: (内容, 已尝试的模型)，全部失败时内容为空字符串
+        """
+        self.hedge.start_call()
+        primary = models[0]
+        attempts = {}
+
+        def launch(model):
+            # claim 保证每次请求只向路由器记录一次 (请求自身完成 / 失败，或作为落败者被取消)
+            cancel, claim = threading.Event(), threading.Lock()
+            future = self._spawn(self._complete_cancellable, task, model, messages, json_mode, cancel, claim)
+            attempts[future] = (model, time.perf_counter(), cancel, claim)
+
+        launch(primary)
+        tried = [primary]
+        done, _ = wait(list(attempts), timeout=self.hedge.delay(task))
+        if not done and self.hedge.try_acquire():
+            alternate = models[1] if self.hedge.alternate_model and len(models) > 1 else primary
+            print(f"⏱️ {task} 请求超过延迟阈值，对冲发往 {alternate}")
+            launch(alternate)
+            if alternate not in tried:
+                tried.append(alternate)
+
+        pending = set(attempts)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                content = future.result()
+                if content:
+                    for other in pending:
+                        model, started, cancel, claim = attempts[other]
+                        # 落败请求的已耗时是其延迟的下界：对冲掩盖的慢请求仍计入 p95，延迟降级才能生效
+                        if claim.acquire(blocking=False):
+                            self.router.record(model, time.perf_counter() - started, ok=True)
+                        cancel.set()
+                    return content, tried
+        return "", tried
+
+    def _complete_cancellable(self, task: str, model: str, messages: List[Dict], json_mode: bool,
+                              cancel: threading.Event, claim: threading.Lock) -> str:
+        """以流式方式完成一次请求，便于在被取消时关闭连接、停止生成；失败或被取消时返回空字符串"""
+        client = self.client.with_options(timeout=TASK_TIMEOUTS.get(task, 120), max_retries=0)
+        start = time.perf_counter()
+        parts = []
+        try:
+            stream = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.7,
+                response_format={"type": "json_object"} if json_mode else {"type": "text"},
+                stream=True
+            )
+            for chunk in stream:
+                if cancel.is_set():
+                    stream.close()
+                    return ""
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+        except Exception as e:
+            if claim.acquire(blocking=False):
+                self.router.record(model, time.perf_counter() - start, ok=False)
+                print(f"⚠️ 模型 {model} 调用失败 ({task}): {e}")
+            return ""
+        if cancel.is_set() or not claim.acquire(blocking=False):
+            return ""
+        latency = time.perf_counter() - start
+        content = "".join(parts)
+        self.router.record(model, latency, ok=bool(content.strip()))
+        if content.strip():
+            self.hedge.record(task, latency)
+        return content
+
+    @staticmethod
+    def _spawn(fn, *args) -> Future:
+        """
+        在守护线程中执行；尚未收到首个文本块的落败请求无法中途关闭，
+        会在超时后自行结束，守护线程保证它不会阻塞进程退出
+        """
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def stream_task(self, task: str, prompt: str, json_mode: bool = False) -> Iterator[str]:
+        """
+        按任务类型路由的流式调用：首个文本块到达前失败可切换模型；
+        已开始输出后中断则结束迭代 (已产出的内容无法撤回)
+        """
+        messages = [{"role": "user", "content": prompt}]
+        models = self.router.candidates(task)
+        for i, model in enumerate(models):
+            client = self.client.with_options(timeout=TASK_TIMEOUTS.get(task, 120),
+                                              max_retries=0 if i < len(models) - 1 else 1)
+            start = time.perf_counter()
+            received = False
+            try:
+                stream = client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=0.7,
+                    response_format={"type": "json_object"} if json_mode else {"type": "text"},
+                    stream=True
+                )
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        received = True
+                        yield chunk.choices[0].delta.content
+            except Exception as e:
+                self.router.record(model, time.perf_counter() - start, ok=False)
+                print(f"⚠️ 模型 {model} 流式调用失败 ({task}): {e}")
+                if received:
+                    return
+                continue
+            self.router.record(model, time.perf_counter() - start, ok=received)
+            if received:
+                return
+        print(f"❌ LLM 流式调用异常: 任务 {task} 的所有候选模型均失败")
@@ -0,0 +1,275 @@
+# src/maintenance.py
+
+import os
+import json
+import time
+import shutil
+import zipfile
+from typing import Dict, List, Optional
+
+# 输出目录下不属于任务的公共目录
+RESERVED_DIRS = {"vector_store", "web_kb", "archive", "chroma_db", "docx_cache", "stats"}
+ARTICLE_FILE = "final_article.md"
+TASK_INDEX_FILE = "tasks_index.json"
+ARCHIVE_DIR = "archive"
+ARCHIVE_FILE = "tasks.zip"
+MANIFEST_FILE = "manifest.json"
+
+# 已压缩格式直接存储，不再二次压缩
+STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".docx", ".zip"}
+# 任务目录的特征文件：满足其一才视为任务，避免误删用户放在输出目录下的其他目录
+TASK_MARKERS = (ARTICLE_FILE, "final_article.docx", "assets", "chroma_db")
+# 最近该时间内仍有文件写入的任务视为运行中，不会被归档
+ACTIVE_GRACE_SECONDS = 3600
+
+
+def _dir_size(path: str) -> int:
+    return _dir_stats(path)[0]
+
+
+def _dir_stats(path: str):
+    """返回 (总字节数, 目录树内文件的最新修改时间；没有文件时取目录本身的 mtime)"""
+    total, newest = 0, 0.0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            total += stat.st_size
+            newest = max(newest, stat.st_mtime)
+    return total, newest or os.path.getmtime(path)
+
+
+def _task_mtime(task_dir: str) -> float:
+    article = os.path.join(task_dir, ARTICLE_FILE)
+    return os.path.getmtime(article if os.path.exists(article) else task_dir)
+
+
+def scan_tasks(output_dir: str, with_size: bool = False) -> List[Dict]:
+    """
+    扫描输出目录下的任务，按时间由新到旧排序
+    每个任务: {"name", "path", "article" (未生成时为 None), "mtime", "updated" (最近写入时间), ["size"]}
+    """
+    tasks = []
+    if not os.path.isdir(output_dir):
+        return tasks
+    for entry in os.scandir(output_dir):
+        if not entry.is_dir() or entry.name in RESERVED_DIRS:
+            continue
+        if not any(os.path.exists(os.path.join(entry.path, m)) for m in TASK_MARKERS):
+            continue
+        article = os.path.join(entry.path, ARTICLE_FILE)
+        size, updated = _dir_stats(entry.path)
+        task = {
+            "name": entry.name,
+            "path": entry.path,
+            "article": article if os.path.isfile(article) else None,
+            # 未生成文章的任务以最近写入时间排序，目录本身的 mtime 不随子目录写入更新
+            "mtime": _task_mtime(entry.path) if os.path.isfile(article) else updated,
+            "updated": updated,
+        }
+        if with_size:
+            task["size"] = size
+        tasks.append(task)
+    return sorted(tasks, key=lambda t: t["mtime"], reverse=True)
+
+
+# ----------------------------------------------------------------------
+# 任务索引：Web UI 直接读取，无需每次扫描输出目录
+# ----------------------------------------------------------------------
+
+def rebuild_task_index(output_dir: str) -> Dict:
+    index = {"tasks": {}, "pending": []}
+    for entry in os.scandir(output_dir):
+        if not entry.is_dir() or entry.name in RESERVED_DIRS:
+            continue
+        article = os.path.join(entry.path, ARTICLE_FILE)
+        if os.path.isfile(article):
+            index["tasks"][entry.name] = {"article": f"{entry.name}/{ARTICLE_FILE}", "mtime": os.path.getmtime(article)}
+        else:
+            # 尚未生成文章的目录 (运行中或失败的任务)，读取索引时再复查
+            index["pending"].append(entry.name)
+    _write_index(output_dir, index)
+    return index
+
+
+def _write_index(output_dir: str, index: Dict):
+    # 原地覆盖写入：首次创建之后不再改变输出目录的 mtime，
+    # 这样 "目录 mtime 晚于索引" 就意味着有任务目录被新建或删除
+    with open(os.path.join(output_dir, TASK_INDEX_FILE), "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+
+
+def _read_index(output_dir: str) -> Optional[Dict]:
+    path = os.path.join(output_dir, TASK_INDEX_FILE)
+    try:
+        if os.path.getmtime(output_dir) > os.path.getmtime(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        # 索引缺失，或正好读到写入中途的文件
+        return None
+
+
+def load_task_index(output_dir: str) -> Dict[str, str]:
+    """
+    读取任务索引，返回 {任务名: 文章路径}，按任务名倒序 (即时间倒序)
+    仅在输出目录有增删或待定任务生成了文章时才重建 / 更新索引
+    """
+    if not os.path.isdir(output_dir):
+        return {}
+    index = _read_index(output_dir)
+    if index is None:
+        index = rebuild_task_index(output_dir)
+    else:
+        done = [n for n in index["pending"] if os.path.isfile(os.path.join(output_dir, n, ARTICLE_FILE))]
+        if done:
+            for name in done:
+                article = os.path.join(output_dir, name, ARTICLE_FILE)
+                index["tasks"][name] = {"article": f"{name}/{ARTICLE_FILE}", "mtime": os.path.getmtime(article)}
+            index["pending"] = [n for n in index["pending"] if n not in done]
+            _write_index(output_dir, index)
+    return {
+        name: os.path.join(output_dir, info["article"])
+        for name, info in sorted(index["tasks"].items(), reverse=True)
+    }
+
+
+# ----------------------------------------------------------------------
+# 归档与保留策略
+# ----------------------------------------------------------------------
+
+def _load_manifest(archive_dir: str) -> Dict:
+    path = os.path.join(archive_dir, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"tasks": {}}
+
+
+def _save_manifest(archive_dir: str, manifest: Dict):
+    path = os.path.join(archive_dir, MANIFEST_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def compact_tasks(output_dir: str, names: List[str], keep_docx: bool = True) -> Dict[str, Dict]:
+    """
+    把任务目录追加进单个归档 (archive/tasks.zip)，写入清单后删除原目录
+    - 任务内的向量库 (旧版 chroma_db) 直接丢弃
+    - keep_docx=False 时不归档 DOCX (可由 Markdown + 图片重新生成，但会丢失手工修改)
+    :return: {任务名: 清单条目}，original_bytes 为删除前整个任务目录的大小
+    """
+    archive_dir = os.path.join(output_dir, ARCHIVE_DIR)
+    os.makedirs(archive_dir, exist_ok=True)
+    manifest = _load_manifest(archive_dir)
+    archived = {}
+
+    with zipfile.ZipFile(os.path.join(archive_dir, ARCHIVE_FILE), "a") as zf:
+        for name in names:
+            task_dir = os.path.join(output_dir, name)
+            if not os.path.isdir(task_dir):
+                continue
+            # 同名任务再次归档时加后缀，避免压缩包内路径冲突
+            arc_name = name if name not in manifest["tasks"] else f"{name}__{int(time.time())}"
+            files, original_bytes = [], _dir_size(task_dir)
+            for root, dirs, filenames in os.walk(task_dir):
+                dirs[:] = [d for d in dirs if d != "chroma_db"]
+                for filename in filenames:
+                    path = os.path.join(root, filename)
+                    ext = os.path.splitext(filename)[1].lower()
+                    if ext == ".docx" and not keep_docx:
+                        continue
+                    rel = os.path.relpath(path, task_dir).replace("\\", "/")
+                    compress = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                    zf.write(path, f"{arc_name}/{rel}", compress_type=compress)
+                    files.append(rel)
+            archived[arc_name] = {
+                "task": name,
+                "archived_at": time.time(),
+                "task_mtime": _task_mtime(task_dir),
+                "files": files,
+                "original_bytes": original_bytes,
+                "archived_bytes": sum(zf.getinfo(f"{arc_name}/{rel}").compress_size for rel in files),
+            }
+
+    # 先落盘清单，再删除原目录：中途失败最多留下重复数据，不会丢数据
+    manifest["tasks"].update(archived)
+    _save_manifest(archive_dir, manifest)
+    for entry in archived.values():
+        shutil.rmtree(os.path.join(output_dir, entry["task"]), ignore_errors=True)
+    return archived
+
+
+def select_for_archive(tasks: List[Dict], max_age_days: Optional[float] = None, max_tasks: Optional[int] = None,
+                       max_total_mb: Optional[float] = None, now: Optional[float] = None) -> List[Dict]:
+    """
+    按保留策略挑选需要归档的任务 (tasks 须按时间由新到旧排序)
+    - max_age_days: 超过该天数的任务
+    - max_tasks: 只保留最新的 N 篇文章
+    - max_total_mb: 保留任务的总大小上限，超出时从最旧的开始归档
+    只有已生成文章的任务计入 max_tasks / max_total_mb；未生成文章的目录 (运行中或失败) 只按时长归档，
+    最近 ACTIVE_GRACE_SECONDS 内仍有写入的任务一律不归档
+    """
+    now = time.time() if now is None else now
+    cutoff = now - max_age_days * 86400 if max_age_days is not None else None
+
+    def active(task):
+        return now - task.get("updated", task["mtime"]) < ACTIVE_GRACE_SECONDS
+
+    articles = [t for t in tasks if t["article"]]
+    selected = set()
+    for task in tasks:
+        if cutoff is not None and task["mtime"] < cutoff and not active(task):
+            selected.add(task["name"])
+    if max_tasks is not None:
+        selected.update(t["name"] for t in articles[max_tasks:] if not active(t))
+
+    if max_total_mb is not None:
+        kept = [t for t in articles if t["name"] not in selected]
+        total = sum(t["size"] for t in kept)
+        for task in reversed(kept):
+            if total <= max_total_mb * 2**20:
+                break
+            if active(task):
+                continue
+            selected.add(task["name"])
+            total -= task["size"]
+    return [t for t in tasks if t["name"] in selected]
+
+
+def enforce_retention(output_dir: str, max_age_days: Optional[float] = None, max_tasks: Optional[int] = None,
+                      max_total_mb: Optional[float] = None, vector_db_path: Optional[str] = None,
+                      keep_docx: bool = True, dry_run: bool = False) -> Dict:
+    """
+    执行保留策略：归档超出策略的任务、回收其在共享向量库中的命名空间，并重建任务索引
+    :return: {"archived": [...], "freed_bytes": int, "namespaces": int}
+             freed_bytes = 被删除的任务目录总大小 (含旧版 chroma_db) - 其在归档中占用的大小
+    """
+    tasks = scan_tasks(output_dir, with_size=max_total_mb is not None)
+    victims = select_for_archive(tasks, max_age_days, max_tasks, max_total_mb)
+    report = {"archived": [t["name"] for t in victims], "freed_bytes": 0, "namespaces": 0}
+
+    if dry_run or not victims:
+        for t in victims:
+            print(f"   🗂️ 将归档: {t['name']}")
+        return report
+
+    archived = compact_tasks(output_dir, [t["name"] for t in victims], keep_docx=keep_docx)
+    report["freed_bytes"] = sum(e["original_bytes"] - e["archived_bytes"] for e in archived.values())
+
+    # 共享向量库中以任务目录名为命名空间，归档后一并回收
+    if vector_db_path and os.path.exists(os.path.join(vector_db_path, "namespaces.json")):
+        from src.rag_engine import RAGEngine
+
+        rag = RAGEngine(vector_db_path=vector_db_path, namespace="__maintenance__")
+        report["namespaces"] = rag.gc_namespaces(
+            max_idle_days=None, namespaces=[e["task"] for e in archived.values()]
+        )["namespaces"]
+
+    rebuild_task_index(output_dir)
+    return report
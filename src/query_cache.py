@@ -0,0 +1,110 @@
+# src/query_cache.py
+
+import os
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    查询向量缓存：内存 LRU + 可选的 SQLite 磁盘缓存，按 (模型, 文本) 哈希寻址
+    重新生成同一章节时无需再次调用 Embedding API
+    """
+
+    def __init__(self, model_name: str, max_entries: int = 2048, disk_path: Optional[str] = None):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vec BLOB)")
+            self._db.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\n{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self._key(text)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT vec FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row:
+                    vec = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vec)
+                    return vec
+        return None
+
+    def put(self, text: str, vec) -> np.ndarray:
+        key = self._key(text)
+        vec = np.asarray(vec, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vec)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO embeddings (key, vec) VALUES (?, ?)", (key, vec.tobytes()))
+                self._db.commit()
+        return vec
+
+    def _remember(self, key: str, vec: np.ndarray):
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+
+class SemanticCache:
+    """
+    语义结果缓存：新查询向量与已缓存查询的余弦相似度超过阈值时，直接返回缓存的检索结果
+    scope 用于区分命名空间、过滤条件与 top_k，不同 scope 之间互不命中
+    """
+
+    def __init__(self, threshold: float = 0.97, max_entries: int = 512):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, List]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vec) -> np.ndarray:
+        vec = np.asarray(vec, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def lookup(self, vec, scope: Hashable) -> Optional[List[str]]:
+        vec = self._normalize(vec)
+        with self._lock:
+            entries = self._entries.get(scope)
+            if not entries:
+                return None
+            matrix = np.stack([v for v, _ in entries])
+            sims = matrix @ vec
+            best = int(np.argmax(sims))
+            if sims[best] >= self.threshold:
+                self._entries.move_to_end(scope)
+                return entries[best][1]
+        return None
+
+    def store(self, vec, scope: Hashable, results: List[str]):
+        with self._lock:
+            self._entries.setdefault(scope, []).append((self._normalize(vec), list(results)))
+            self._entries.move_to_end(scope)
+            # 按 scope 维度淘汰最久未使用的条目
+            while sum(len(v) for v in self._entries.values()) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._entries[oldest].pop(0)
+                if not self._entries[oldest]:
+                    del self._entries[oldest]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
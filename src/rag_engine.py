@@ -1,36 +1,178 @@
 # src/rag_engine.py
 import os
+import json
+import time
 import shutil
-from typing import List
+import hashlib
+import uuid
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Optional, TYPE_CHECKING
 from dotenv import load_dotenv
 
-# LangChain 组件
-from langchain_community.document_loaders import DirectoryLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings 
+# LangChain / Chroma / numpy 等重依赖均在首次使用时才导入：
+# 没有上传资料的任务不会加载向量检索相关的任何模块
+if TYPE_CHECKING:
+    import numpy as np
 
 load_dotenv()
 
+# 每批送去向量化的切片数：摄取过程的内存占用由批大小决定，与语料总量无关
+EMBED_BATCH_SIZE = 64
+
+# 共享库中命名空间的 last_used 最多每隔多久写回一次注册表
+NAMESPACE_TOUCH_INTERVAL = 3600
+
+
+_PROCESS_LOCKS: Dict[str, threading.Lock] = {}
+_PROCESS_LOCKS_GUARD = threading.Lock()
+
+
+@contextmanager
+def file_lock(path: str):
+    """
+    跨进程互斥锁 (锁文件 + flock / msvcrt)
+    多个 Streamlit 会话、CLI 的 gc / maintenance 进程会同时读-改-写同一个注册表；
+    同一进程内的线程另用 threading.Lock 串行，不依赖文件锁在线程间的语义
+    """
+    with _PROCESS_LOCKS_GUARD:
+        local = _PROCESS_LOCKS.setdefault(os.path.abspath(path), threading.Lock())
+    with local:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a+b") as f:
+            if os.name == "nt":
+                import msvcrt
+
+                f.seek(0)
+                while True:
+                    try:
+                        # LK_LOCK 重试 10 次 (约 10 秒) 后仍拿不到锁会抛出 OSError，继续等待
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+                try:
+                    yield
+                finally:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
 class RAGEngine:
-    def __init__(self, vector_db_path="./output/chroma_db"):
+    def __init__(self, vector_db_path="./output/chroma_db", namespace=None, web_kb_path=None, web_kb_ttl_days=7,
+                 hnsw_params: Optional[Dict[str, int]] = None, quantized: bool = False,
+                 embedding_cache_path: Optional[str] = None, semantic_cache_threshold: Optional[float] = 0.97):
+        """
+        :param namespace: 为空时沿用"一个任务一个向量库目录"的旧模式；
+                          指定后 vector_db_path 视为多任务共享的持久化库，
+                          同一文件 (按内容哈希) 只切片、向量化一次，各命名空间仅记录引用
+        :param hnsw_params: HNSW 参数 {"M", "ef_construction", "ef_search"}；
+                            M 与 ef_construction 只在新建集合时生效，ef_search 可随时调整
+        :param quantized: 启用 int8 量化索引检索 (粗排 + float32 精确重打分)，降低大库内存占用
+        :param embedding_cache_path: 查询向量的 SQLite 磁盘缓存路径，为空时只使用内存 LRU
+        :param semantic_cache_threshold: 语义结果缓存的余弦阈值，None 表示关闭
+        """
         self.vector_db_path = vector_db_path
         self.vector_store = None
+        self.namespace = namespace
+        self.registry_path = os.path.join(vector_db_path, "namespaces.json")
+        # 注册表的读-改-写须持有该锁 (跨进程)
+        self.registry_lock_path = f"{self.registry_path}.lock"
+
+        self.hnsw_params = hnsw_params or {}
+        self.quantized = quantized
+        self.quantized_index_dir = os.path.join(vector_db_path, "int8_index")
+        self.quantized_index = None
+        # 库内容每次变化都会写入新的版本号，量化索引记录构建时的版本号
+        self.generation_path = os.path.join(vector_db_path, "generation")
+
+        # 跨任务的互联网知识库 (可选)：抓取过的网页正文长期保存，带 TTL
+        self.web_kb_path = web_kb_path
+        self.web_kb_ttl = web_kb_ttl_days * 24 * 3600
+        self.web_store = None
+        self._web_lock = threading.Lock()
         
-        api_key = os.getenv("SILICONFLOW_API_KEY")
-        if not api_key:
+        self.api_key = os.getenv("SILICONFLOW_API_KEY")
+        if not self.api_key:
             raise ValueError("❌ 未找到 SILICONFLOW_API_KEY")
+        self._embedding_model = None
 
-        print("⚙️ 初始化 RAG 引擎 (Cloud Embedding)...")
-        
-        # 配置 Embedding API
-        # SiliconFlow 兼容 OpenAI 接口规范
-        self.embedding_model = OpenAIEmbeddings(
-            model="BAAI/bge-m3",                # 指定硅基流动支持的 Embedding 模型
-            openai_api_key=api_key,
-            openai_api_base="https://api.siliconflow.cn/v1",
-            check_embedding_ctx_length=False    # 关闭本地 Token 检查
-        )
+        # 查询向量缓存 + 语义结果缓存：重写/微调同一章节时不再重复调用 Embedding API
+        self.embedding_cache_path = embedding_cache_path
+        self.semantic_cache_threshold = semantic_cache_threshold
+        self._embedding_cache = None
+        self._semantic_cache = None
+
+    @property
+    def embedding_model(self):
+        if self._embedding_model is None:
+            from langchain_openai import OpenAIEmbeddings
+
+            print("⚙️ 初始化 RAG 引擎 (Cloud Embedding)...")
+            
+            # 配置 Embedding API
+            # SiliconFlow 兼容 OpenAI 接口规范
+            self._embedding_model = OpenAIEmbeddings(
+                model="BAAI/bge-m3",                # 指定硅基流动支持的 Embedding 模型
+                openai_api_key=self.api_key,
+                openai_api_base="https://api.siliconflow.cn/v1",
+                check_embedding_ctx_length=False    # 关闭本地 Token 检查
+            )
+        return self._embedding_model
+
+    @property
+    def embedding_cache(self):
+        if self._embedding_cache is None:
+            from src.query_cache import EmbeddingCache
+            self._embedding_cache = EmbeddingCache("BAAI/bge-m3", disk_path=self.embedding_cache_path)
+        return self._embedding_cache
+
+    @property
+    def semantic_cache(self):
+        if self._semantic_cache is None and self.semantic_cache_threshold:
+            from src.query_cache import SemanticCache
+            self._semantic_cache = SemanticCache(self.semantic_cache_threshold)
+        return self._semantic_cache
+
+    def _get_vector_store(self):
+        if self.vector_store is None:
+            from langchain_chroma import Chroma
+
+            self.vector_store = Chroma(
+                persist_directory=self.vector_db_path,
+                embedding_function=self.embedding_model,
+                collection_metadata=self._hnsw_metadata() or None
+            )
+            if "ef_search" in self.hnsw_params:
+                self._apply_ef_search(self.hnsw_params["ef_search"])
+        return self.vector_store
+
+    def _hnsw_metadata(self) -> Dict[str, int]:
+        keys = {"M": "hnsw:M", "ef_construction": "hnsw:construction_ef", "ef_search": "hnsw:search_ef"}
+        return {keys[k]: v for k, v in self.hnsw_params.items() if k in keys}
+
+    def _apply_ef_search(self, ef_search: int):
+        """已存在的集合不会读取新的创建参数，ef_search 需单独修改 (须在首次检索加载索引之前)"""
+        try:
+            self.vector_store._collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+        except Exception as e:
+            print(f"⚠️ 当前 Chroma 版本不支持在线修改 ef_search: {e}")
 
     def ingest_data(self, data_dir: str):
         """
@@ -43,58 +185,389 @@ class RAGEngine:
 
         print(f"📂 扫描文档目录: {data_dir}")
         
-        # 1. 加载所有 txt 文件 (根据需要可加 "*.pdf")
-        loader = DirectoryLoader(data_dir, glob="**/*.txt", show_progress=True)
-        try:
-            docs = loader.load()
-        except Exception as e:
-            print(f"❌ 加载失败: {e}")
-            return
+        from src.doc_loader import discover_files
 
-        if not docs:
+        # 1. 按类型加载 txt / md / pdf / docx (多进程并行，逐文件流入切片)
+        paths = discover_files(data_dir)
+        if not paths:
             print("⚠️ 目录下没有找到文档。")
             return
 
-        print(f"   -> 找到 {len(docs)} 个文件")
+        print(f"   -> 找到 {len(paths)} 个文件")
 
-        # 2. 文本切片 (Chunking)
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=800, 
-            chunk_overlap=100
-        )
-        splits = text_splitter.split_documents(docs)
-        print(f"   -> 切分为 {len(splits)} 个文本块")
+        if self.namespace:
+            self._ingest_shared(paths)
+            return
 
-        # 3. 向量化并存储 (这一步会消耗 API Token)
-        print("   -> 正在调用 API 生成向量 (请稍候)...")
-        
         # 清理旧数据 (可选)
         if os.path.exists(self.vector_db_path):
             try:
                 shutil.rmtree(self.vector_db_path)
             except:
                 pass 
+        self.vector_store = None
 
-        self.vector_store = Chroma.from_documents(
-            documents=splits,
-            embedding=self.embedding_model,
-            persist_directory=self.vector_db_path
-        )
-        print(f"✅ 知识库构建完成！")
+        total = self._embed_documents(paths)
+        if not total:
+            print("⚠️ 文档中没有可用的文本内容。")
+            return
+        print(f"✅ 知识库构建完成！共 {total} 个文本块")
 
-    def query_knowledge_base(self, query: str, top_k: int = 5) -> List[str]:
+    def _embed_documents(self, paths: List[str], file_hashes: Optional[Dict[str, str]] = None) -> Dict[str, int]:
+        """
+        流式切片 (标题 / 中文句子边界优先) -> 分批向量化并存储 (这一步会消耗 API Token)
+        :return: {文件路径: 切片数}
+        """
+        from src.chunker import batched, iter_chunks
+        from src.doc_loader import LoadReport, iter_documents
+
+        print("   -> 正在切片并调用 API 生成向量 (请稍候)...")
+        store = self._get_vector_store()
+        report = LoadReport()
+        docs = iter_documents(paths, report=report)
+        if file_hashes:
+            docs = self._tag_documents(docs, file_hashes)
+        counts = {}
+        for batch in batched(iter_chunks(docs, chunk_size=800, chunk_overlap=100), EMBED_BATCH_SIZE):
+            store.add_documents(batch, ids=[d.metadata["chunk_id"] for d in batch])
+            for d in batch:
+                counts[d.metadata["source"]] = counts.get(d.metadata["source"], 0) + 1
+        print(report.summary())
+        self._on_store_changed()
+        return counts
+
+    @staticmethod
+    def _tag_documents(docs, file_hashes: Dict[str, str]):
+        for doc in docs:
+            path = doc.metadata["source"]
+            doc.metadata["file_hash"] = file_hashes[path]
+            doc.metadata["uploaded_at"] = os.path.getmtime(path)
+            yield doc
+
+    def _ingest_shared(self, paths: List[str]):
+        """共享库模式：按内容哈希去重，只有库中不存在的文件才会被切片与向量化"""
+        now = time.time()
+        hashes = {path: file_sha256(path) for path in paths}
+
+        # 向量化耗时较长，在锁外进行；登记时再在锁内复查
+        new_paths = self._unregistered(hashes, self._load_registry())
+        print(f"   -> {len(paths) - len(new_paths)} 个文件已在共享库中，跳过向量化")
+        counts = self._embed_documents(new_paths, hashes) if new_paths else {}
+
+        with file_lock(self.registry_lock_path):
+            registry = self._load_registry()
+            self._register_files(registry, new_paths, hashes, counts, now)
+            # 向量化期间其他进程的 gc 可能回收了原本已在库中的文件，需在锁内补做
+            missing = [path for path in self._unregistered(hashes, registry) if path not in new_paths]
+            if missing:
+                counts = self._embed_documents(missing, hashes)
+                self._register_files(registry, missing, hashes, counts, now)
+
+            # 命名空间的资料集合即本次导入的目录内容 (只登记成功产出切片的文件)
+            files = {
+                digest: {"source": os.path.basename(path), "uploaded_at": os.path.getmtime(path)}
+                for path, digest in hashes.items() if digest in registry["files"]
+            }
+            registry["namespaces"][self.namespace] = {
+                "files": files,
+                "created_at": registry["namespaces"].get(self.namespace, {}).get("created_at", now),
+                "last_used": now,
+            }
+            self._save_registry(registry)
+        failed = len(set(hashes.values())) - len(files)
+        if failed:
+            print(f"⚠️ {failed} 个文件没有产出任何切片，未登记到共享库 (下次导入时重试)")
+        print(f"✅ 知识库构建完成！命名空间 [{self.namespace}] 共 {len(files)} 个文件")
+
+    @staticmethod
+    def _unregistered(hashes: Dict[str, str], registry: Dict) -> List[str]:
+        """库中尚不存在的文件 (同一内容只取一个路径)"""
+        paths, seen = [], set()
+        for path, digest in hashes.items():
+            if digest not in registry["files"] and digest not in seen:
+                paths.append(path)
+                seen.add(digest)
+        return paths
+
+    @staticmethod
+    def _register_files(registry: Dict, paths: List[str], hashes: Dict[str, str], counts: Dict[str, int], now: float):
+        # 加载失败 / 没有文本的文件不登记，否则之后会被当作已入库而永不重试
+        for path in paths:
+            if counts.get(path, 0) > 0:
+                registry["files"][hashes[path]] = {"source": path, "chunks": counts[path], "ingested_at": now}
+
+    def query_knowledge_base(self, query: str, top_k: int = 5, sources: Optional[List[str]] = None,
+                             uploaded_after: Optional[float] = None,
+                             uploaded_before: Optional[float] = None) -> List[str]:
         """
         根据问题检索相关资料
+        共享库模式下只检索本命名空间引用的文件，可按文件名与上传时间进一步过滤
         """
-        if not self.vector_store:
-            if os.path.exists(self.vector_db_path):
-                self.vector_store = Chroma(
-                    persist_directory=self.vector_db_path, 
-                    embedding_function=self.embedding_model
-                )
-            else:
+        search_filter = None
+        file_hashes = None
+        if self.namespace:
+            file_hashes = self._namespace_files(sources, uploaded_after, uploaded_before)
+            if not file_hashes:
                 return []
+            search_filter = {"file_hash": {"$in": file_hashes}}
+        elif not self.vector_store and not os.path.exists(self.vector_db_path):
+            return []
+
+        query_vec = self._embed_query(query)
+        scope = (self.namespace, tuple(sorted(file_hashes or [])), top_k)
+        if self.semantic_cache is not None:
+            cached = self.semantic_cache.lookup(query_vec, scope)
+            if cached is not None:
+                return cached
+
+        if self.quantized:
+            results = self._quantized_search(query_vec, top_k, file_hashes)
+        else:
+            docs = self._get_vector_store().similarity_search_by_vector(
+                query_vec.tolist(), k=top_k, filter=search_filter
+            )
+            results = [doc.page_content for doc in docs]
+
+        if self.semantic_cache is not None:
+            self.semantic_cache.store(query_vec, scope, results)
+        return results
+
+    def _embed_query(self, query: str) -> "np.ndarray":
+        vec = self.embedding_cache.get(query)
+        if vec is None:
+            vec = self.embedding_cache.put(query, self.embedding_model.embed_query(query))
+        return vec
+
+    # ------------------------------------------------------------------
+    # int8 量化检索
+    # ------------------------------------------------------------------
+
+    def _quantized_search(self, query_vec: "np.ndarray", top_k: int, file_hashes: Optional[List[str]]) -> List[str]:
+        index = self._get_quantized_index()
+        hits = index.search(query_vec, k=top_k, allowed_tags=set(file_hashes) if file_hashes is not None else None)
+        if not hits:
+            return []
+        found = self._get_vector_store().get(ids=[i for i, _ in hits], include=["documents"])
+        by_id = dict(zip(found["ids"], found["documents"]))
+        return [by_id[i] for i, _ in hits if i in by_id]
+
+    def _get_quantized_index(self):
+        """
+        索引在摄取/回收后失效，下一次检索时从 Chroma 中已存的向量重建
+        库可能被其他进程 (未开启量化的会话、gc / maintenance) 修改，加载磁盘索引前核对库版本号
+        """
+        generation = self._store_generation()
+        if self.quantized_index is None or self.quantized_index.info.get("generation", "") != generation:
+            from src.vector_index import QuantizedIndex
+
+            index = QuantizedIndex(self.quantized_index_dir)
+            if not index.load() or index.info.get("generation", "") != generation:
+                self._build_quantized_index(index, generation)
+            self.quantized_index = index
+        return self.quantized_index
+
+    def _build_quantized_index(self, index, generation: str, page_size: int = 5000):
+        """分页从 Chroma 读出向量直接写入索引文件，不在内存中拼接整个库的 float32 向量"""
+        print("   -> 正在构建 int8 量化索引...")
+        # 版本号在读取向量之前取得：构建期间库若再次变化，下次检索仍会重建
+        index.build_from_pages(self._iter_store_pages(page_size), info={"generation": generation})
+
+    def _iter_store_pages(self, page_size: int):
+        import numpy as np
+
+        store = self._get_vector_store()
+        offset = 0
+        while True:
+            page = store.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                return
+            tags = [(m or {}).get("file_hash", "") for m in page["metadatas"]]
+            yield page["ids"], np.asarray(page["embeddings"], dtype=np.float32), tags
+            offset += len(page["ids"])
+
+    def _store_generation(self) -> str:
+        try:
+            with open(self.generation_path, "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except OSError:
+            return ""
+
+    def _on_store_changed(self):
+        """库内容变化后，缓存的检索结果与量化索引都需要失效 (无论本实例是否开启量化)"""
+        if self._semantic_cache is not None:
+            self._semantic_cache.clear()
+        os.makedirs(self.vector_db_path, exist_ok=True)
+        tmp_path = f"{self.generation_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp_path, self.generation_path)
+        meta_path = os.path.join(self.quantized_index_dir, "meta.json")
+        if os.path.exists(meta_path):
+            try:
+                os.remove(meta_path)
+            except OSError:
+                pass
+        self.quantized_index = None
+
+    # ------------------------------------------------------------------
+    # 共享库：命名空间注册表
+    # ------------------------------------------------------------------
+
+    def _load_registry(self) -> Dict:
+        try:
+            with open(self.registry_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"namespaces": {}, "files": {}}
+
+    def _save_registry(self, registry: Dict):
+        os.makedirs(self.vector_db_path, exist_ok=True)
+        tmp_path = f"{self.registry_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(registry, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.registry_path)
+
+    def _namespace_files(self, sources=None, uploaded_after=None, uploaded_before=None) -> List[str]:
+        registry = self._load_registry()
+        entry = registry["namespaces"].get(self.namespace)
+        if not entry:
+            return []
+
+        if time.time() - entry.get("last_used", 0) > NAMESPACE_TOUCH_INTERVAL:
+            with file_lock(self.registry_lock_path):
+                registry = self._load_registry()
+                if self.namespace in registry["namespaces"]:
+                    registry["namespaces"][self.namespace]["last_used"] = time.time()
+                    self._save_registry(registry)
+
+        return [
+            digest for digest, info in entry["files"].items()
+            if (not sources or info["source"] in sources)
+            and (uploaded_after is None or info["uploaded_at"] >= uploaded_after)
+            and (uploaded_before is None or info["uploaded_at"] <= uploaded_before)
+        ]
+
+    def gc_namespaces(self, max_idle_days: Optional[float] = 30,
+                      namespaces: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        回收长期未使用 (或显式指定) 的命名空间，并删除不再被任何命名空间引用的文件切片
+        :param max_idle_days: None 表示不按闲置时间回收
+        :param namespaces: 额外需要回收的命名空间 (如已归档的任务)
+        :return: {"namespaces": 删除的命名空间数, "files": 删除的文件数, "chunks": 删除的切片数}
+        """
+        with file_lock(self.registry_lock_path):
+            registry = self._load_registry()
+            stale = [ns for ns in (namespaces or []) if ns in registry["namespaces"]]
+            if max_idle_days is not None:
+                cutoff = time.time() - max_idle_days * 24 * 3600
+                stale += [ns for ns, info in registry["namespaces"].items()
+                          if info.get("last_used", 0) < cutoff and ns not in stale]
+            for ns in stale:
+                del registry["namespaces"][ns]
+
+            referenced = {d for info in registry["namespaces"].values() for d in info["files"]}
+            orphans = [d for d in registry["files"] if d not in referenced]
+            removed_chunks = 0
+            if orphans:
+                from src.chunker import batched
+
+                store = self._get_vector_store()
+                for batch in batched(orphans, 100):
+                    ids = store.get(where={"file_hash": {"$in": batch}}).get("ids", [])
+                    if ids:
+                        store.delete(ids=ids)
+                        removed_chunks += len(ids)
+                for d in orphans:
+                    del registry["files"][d]
+                self._on_store_changed()
+            self._save_registry(registry)
+
+        print(f"🧹 回收命名空间 {len(stale)} 个，文件 {len(orphans)} 个，切片 {removed_chunks} 个")
+        return {"namespaces": len(stale), "files": len(orphans), "chunks": removed_chunks}
+
+    # ------------------------------------------------------------------
+    # 互联网知识库 (跨会话持久化)
+    # ------------------------------------------------------------------
+
+    def _get_web_store(self):
+        if self.web_store is None and self.web_kb_path:
+            from langchain_chroma import Chroma
+
+            self.web_store = Chroma(
+                collection_name="web_kb",
+                persist_directory=self.web_kb_path,
+                embedding_function=self.embedding_model,
+                # 余弦距离，使相关度分数落在 [0, 1]，便于设置 min_score 阈值
+                collection_metadata={"hnsw:space": "cosine"}
+            )
+        return self.web_store
+
+    def add_web_documents(self, pages: List[Dict]):
+        """
+        将抓取到的网页切片、向量化后存入互联网知识库
+        :param pages: [{"url": ..., "title": ..., "text": ...}]
+        """
+        store = self._get_web_store()
+        if store is None:
+            return
+        from langchain_core.documents import Document
+        from src.chunker import chunk_document
+
+        now = time.time()
+        docs, ids, urls = [], [], []
+        for page in pages:
+            url, text = page.get("url"), (page.get("text") or "").strip()
+            if not url or not text:
+                continue
+            urls.append(url)
+            metadata = {
+                "url": url,
+                "title": page.get("title", ""),
+                "fetched_at": now,
+                "expires_at": now + self.web_kb_ttl,
+            }
+            for idx, chunk in enumerate(chunk_document(Document(page_content=text, metadata={}))):
+                docs.append(Document(page_content=chunk.page_content, metadata=metadata))
+                ids.append(hashlib.sha1(f"{url}#{idx}".encode("utf-8")).hexdigest())
+
+        if not docs:
+            return
+        with self._web_lock:
+            try:
+                # 同一 URL 重新抓取时整体替换，避免旧切片残留
+                old = store.get(where={"url": {"$in": urls}})
+                if old.get("ids"):
+                    store.delete(ids=old["ids"])
+                store.add_documents(docs, ids=ids)
+            except Exception as e:
+                print(f"⚠️ 互联网知识库写入失败: {e}")
+
+    def query_web_knowledge(self, query: str, top_k: int = 6, min_score: float = 0.5) -> List[Dict]:
+        """
+        检索未过期的互联网知识，返回与搜索结果相同的结构 {"title", "href", "body"}
+        """
+        if not self.web_kb_path or not os.path.exists(self.web_kb_path):
+            return []
+        store = self._get_web_store()
+        try:
+            results = store.similarity_search_with_relevance_scores(
+                query, k=top_k, filter={"expires_at": {"$gt": time.time()}}
+            )
+        except Exception as e:
+            print(f"⚠️ 互联网知识库检索失败: {e}")
+            return []
+        return [
+            {"title": doc.metadata.get("title", ""), "href": doc.metadata.get("url", ""), "body": doc.page_content}
+            for doc, score in results if score >= min_score
+        ]
 
-        # 检索时也会自动调用 API 将 query 向量化
-        results = self.vector_store.similarity_search(query, k=top_k)
-        return [doc.page_content for doc in results]
+    def prune_web_knowledge(self) -> int:
+        """删除已过期的互联网知识切片，返回删除数量"""
+        if not self.web_kb_path or not os.path.exists(self.web_kb_path):
+            return 0
+        store = self._get_web_store()
+        with self._web_lock:
+            expired = store.get(where={"expires_at": {"$lte": time.time()}})
+            if expired.get("ids"):
+                store.delete(ids=expired["ids"])
+            return len(expired.get("ids", []))
@@ -1,12 +1,15 @@
 # src/search_engine.py
 
 import os
+import re
 import time
 import logging
+import threading
 import requests
 import random
-from bs4 import BeautifulSoup
-from duckduckgo_search import DDGS
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
 from urllib.parse import urljoin, urlparse
 from typing import List, Dict
 
@@ -30,6 +33,7 @@ class ImageSearcher:
         logger.info(f"🔍 [Text Search] '{keyword}'")
         results = []
         try:
+            from duckduckgo_search import DDGS
             with DDGS() as ddgs:
                 gen_results = ddgs.text(
                     keywords=keyword, 
@@ -85,6 +89,7 @@ class ImageSearcher:
     def _fetch_image_urls_ddgs(self, keyword, size="Large", layout="Wide"):
         urls = []
         try:
+            from duckduckgo_search import DDGS
             with DDGS() as ddgs:
                 # size 参数: Small, Medium, Large, Wallpaper
                 # layout 参数: Square, Tall, Wide
@@ -105,6 +110,7 @@ class ImageSearcher:
         """备用爬虫 (通常只能获取到中等质量)"""
         urls = []
         try:
+            from bs4 import BeautifulSoup
             search_url = f"https://www.bing.com/images/search?q={keyword}&first=1"
             response = requests.get(search_url, headers=self.headers, timeout=5)
             soup = BeautifulSoup(response.text, 'lxml')
@@ -151,3 +157,191 @@ class ImageSearcher:
             logger.warning(f"  -> 下载异常: {str(e)[:50]}...")
             pass
         return False
+
+
+class PageFetcher:
+    """
+    并发抓取搜索结果全文 (正文提取 + URL 缓存)
+    - 连接池复用的 requests.Session + 线程池并发
+    - 每个域名的并发上限，避免对单站点施压
+    - 总时间预算：超时未完成的页面直接放弃，不阻塞章节写作
+    """
+
+    BOILERPLATE_TAGS = ["script", "style", "noscript", "nav", "footer", "header", "aside", "form", "iframe", "svg"]
+    # 按 class / id 的完整词条匹配 (如 "sidebar"、"site-footer")，
+    # 避免 "layout-with-sidebar"、"category-navigation-tech" 这类正文容器被误删
+    BOILERPLATE_ATTR = re.compile(
+        r'^(?:(?:site|page|main|post|top|bottom|global)[-_])?'
+        r'(?:comments?|footer|sidebar|nav|navbar|navigation|menu|advert|ads?|banner|share|sharing|social|'
+        r'related|related[-_]posts|breadcrumbs?|cookies?|cookie[-_]banner)'
+        r'(?:[-_](?:left|right|top|bottom|area|wrapper|container|list|links|bar|box|section|widget|buttons?|icons|tools))?$',
+        re.I
+    )
+    # 文本量大且链接占比低的元素视为正文，即使 class 命中也不删除
+    CONTENT_MIN_CHARS = 500
+    CONTENT_MAX_LINK_DENSITY = 0.3
+
+    def __init__(self, max_workers=8, per_host=2, timeout=6, time_budget=10,
+                 cache_size=256, max_bytes=2 * 1024 * 1024):
+        self.timeout = timeout
+        self.time_budget = time_budget
+        self.per_host = per_host
+        self.max_bytes = max_bytes
+        self.headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+            "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.5",
+        }
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(self.headers)
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="page-fetch")
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def fetch_many(self, urls: List[str]) -> Dict[str, str]:
+        """
+        并发抓取多个 URL，返回 {url: 正文}；失败或超出时间预算的 URL 不出现在结果中
+        """
+        results = {}
+        pending = {}
+        deadline = time.monotonic() + self.time_budget
+        for url in dict.fromkeys(urls):
+            cached = self._cache_get(url)
+            if cached is not None:
+                if cached:
+                    results[url] = cached
+                continue
+            pending[self._pool.submit(self._fetch, url, deadline)] = url
+
+        if pending:
+            done, not_done = wait(pending, timeout=self.time_budget)
+            for future in not_done:
+                future.cancel()
+                logger.info(f"  -> 抓取超出时间预算，放弃: {pending[future]}")
+            for future in done:
+                text = future.result()
+                if text:
+                    results[pending[future]] = text
+        return results
+
+    def close(self):
+        """释放抓取线程池与连接池"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+    def _fetch(self, url: str, deadline: float) -> str:
+        host = urlparse(url).netloc
+        with self._lock:
+            limit = self._host_limits.setdefault(host, threading.BoundedSemaphore(self.per_host))
+
+        text = ""
+        with limit:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return ""
+            try:
+                with self.session.get(url, timeout=min(self.timeout, remaining), stream=True) as response:
+                    content_type = response.headers.get("Content-Type", "")
+                    if response.status_code == 200 and "html" in content_type:
+                        raw = response.raw.read(self.max_bytes, decode_content=True)
+                        text = self.extract_text(self._decode(raw, content_type))
+            except Exception as e:
+                logger.info(f"  -> 页面抓取失败 {url}: {str(e)[:50]}")
+        # 失败结果同样缓存 (空字符串)，避免同一会话内反复请求坏链接
+        self._cache_put(url, text)
+        return text
+
+    @staticmethod
+    def _decode(raw: bytes, content_type: str):
+        """优先使用响应头声明的编码；未声明时尝试 UTF-8，再交给 lxml 按 <meta> 识别"""
+        match = re.search(r'charset=([\w-]+)', content_type, re.I)
+        if match:
+            try:
+                return raw.decode(match.group(1), errors="replace")
+            except LookupError:
+                pass
+        try:
+            return raw.decode("utf-8")
+        except UnicodeDecodeError:
+            return raw
+
+    @classmethod
+    def extract_text(cls, html) -> str:
+        """基于 lxml 的正文提取：去除导航/页脚等模板元素，保留段落级文本"""
+        from lxml import html as lxml_html
+        from lxml.etree import ParserError
+
+        if isinstance(html, str):
+            # lxml 不接受带编码声明的 str 输入
+            html = re.sub(r'^\s*<\?xml[^>]*\?>', '', html)
+        try:
+            tree = lxml_html.fromstring(html)
+        except (ParserError, ValueError):
+            return ""
+
+        for el in tree.xpath("//" + " | //".join(cls.BOILERPLATE_TAGS)):
+            el.drop_tree()
+
+        # 优先使用语义化正文容器；正文容器及其祖先节点不会被当作模板元素删除
+        roots = tree.xpath("//article") or tree.xpath("//main") or [tree]
+        protected = set(roots)
+        for root in roots:
+            protected.update(root.iterancestors())
+        for el in tree.xpath("//body//*[@class or @id]"):
+            if el in protected or el.getparent() is None:
+                continue
+            tokens = f"{el.get('class', '')} {el.get('id', '')}".split()
+            if any(cls.BOILERPLATE_ATTR.match(t) for t in tokens) and not cls._looks_like_content(el):
+                el.drop_tree()
+
+        blocks = []
+        for root in roots:
+            for el in root.iter("p", "h1", "h2", "h3", "h4", "li", "td"):
+                text = " ".join(el.text_content().split())
+                if len(text) >= 15:
+                    blocks.append(text)
+        return "\n".join(dict.fromkeys(blocks))
+
+    @classmethod
+    def _looks_like_content(cls, el) -> bool:
+        text_len = len(" ".join(el.text_content().split()))
+        if text_len < cls.CONTENT_MIN_CHARS:
+            return False
+        link_len = sum(len(" ".join(a.text_content().split())) for a in el.iter("a"))
+        return link_len / text_len <= cls.CONTENT_MAX_LINK_DENSITY
+
+    @staticmethod
+    def chunk_text(text: str, chunk_size: int = 600, overlap: int = 80) -> List[str]:
+        """按段落切分为定长片段，供上下文组装挑选"""
+        chunks, current = [], ""
+        for para in text.split("\n"):
+            if current and len(current) + len(para) + 1 > chunk_size:
+                chunks.append(current)
+                current = current[-overlap:] if overlap else ""
+            current = f"{current}\n{para}" if current else para
+            while len(current) > chunk_size:
+                chunks.append(current[:chunk_size])
+                current = current[chunk_size - overlap:]
+        if current.strip():
+            chunks.append(current)
+        return chunks
+
+    def _cache_get(self, url: str):
+        with self._lock:
+            if url in self._cache:
+                self._cache.move_to_end(url)
+                return self._cache[url]
+        return None
+
+    def _cache_put(self, url: str, text: str):
+        with self._lock:
+            self._cache[url] = text
+            self._cache.move_to_end(url)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
@@ -0,0 +1,168 @@
+# src/vector_index.py
+
+import os
+import json
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 分块扫描的行数：控制单次反量化的临时内存 (行数 x 维度 x 4 字节)
+SCAN_BLOCK_ROWS = 8192
+
+
+class QuantizedIndex:
+    """
+    int8 标量量化向量索引
+    - 内存中只保留 int8 编码 (bge-m3 1024 维：每条 1KB，约为 float32 的 1/4)
+    - 原始 float32 向量以 memmap 形式留在磁盘，仅对粗排候选读取并做精确重打分
+    - 定位是省内存而非提速：全库扫描时反量化的开销使其慢于 float32 暴力检索，
+      按标签过滤 (命名空间) 时只扫描命中的行
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.ids: List[str] = []
+        self.codes: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+        self.vectors: Optional[np.ndarray] = None
+        # 过滤标签：标签表 + 每行的标签编号，检索时的过滤掩码完全向量化
+        self.tag_vocab: List[str] = []
+        self.tag_ids: Optional[np.ndarray] = None
+        self._tag_index: Dict[str, int] = {}
+        # 构建时附带的额外信息 (如所属向量库的版本号)，用于判断索引是否过期
+        self.info: Dict = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def _paths(self):
+        return {
+            "meta": os.path.join(self.index_dir, "meta.json"),
+            "codes": os.path.join(self.index_dir, "codes.npy"),
+            "scale": os.path.join(self.index_dir, "scale.npy"),
+            "tag_ids": os.path.join(self.index_dir, "tag_ids.npy"),
+            "vectors": os.path.join(self.index_dir, "vectors.f32"),
+        }
+
+    def build(self, ids: Sequence[str], vectors: np.ndarray, tags: Optional[Sequence[str]] = None,
+              info: Optional[Dict] = None) -> int:
+        """
+        :param tags: 每条向量的过滤标签 (如 file_hash)，检索时可限定标签集合
+        :param info: 随索引一起保存的额外信息，加载后见 self.info
+        """
+        return self.build_from_pages([(ids, vectors, tags)], info=info)
+
+    def build_from_pages(self, pages: Iterable[Tuple[Sequence[str], np.ndarray, Optional[Sequence[str]]]],
+                         info: Optional[Dict] = None) -> int:
+        """
+        分页构建：每页 (ids, vectors, tags) 直接追加写入磁盘上的 float32 文件，
+        再分块量化写入 int8 编码，峰值内存与单页大小相关，与库的总量无关
+        :return: 索引的向量条数 (0 表示没有数据，未生成索引)
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        paths = self._paths
+        # 先删除 meta.json：构建中途失败时不会加载到不完整的索引
+        if os.path.exists(paths["meta"]):
+            os.remove(paths["meta"])
+
+        ids, tag_ids, vocab = [], [], {}
+        max_abs, dim = None, None
+        tmp_vectors = f"{paths['vectors']}.tmp"
+        with open(tmp_vectors, "wb") as f:
+            for page_ids, page_vectors, page_tags in pages:
+                page_vectors = np.ascontiguousarray(page_vectors, dtype=np.float32)
+                if not len(page_ids):
+                    continue
+                dim = page_vectors.shape[1]
+                f.write(page_vectors.tobytes())
+                page_max = np.abs(page_vectors).max(axis=0)
+                max_abs = page_max if max_abs is None else np.maximum(max_abs, page_max)
+                ids.extend(page_ids)
+                tag_ids.extend(vocab.setdefault(t, len(vocab)) for t in (page_tags or [""] * len(page_ids)))
+        if not ids:
+            os.remove(tmp_vectors)
+            # 清空内存中可能已加载的旧数据
+            self.ids, self.info = [], info or {}
+            return 0
+        os.replace(tmp_vectors, paths["vectors"])
+
+        # 按维度对称量化：scale_j = max|x_j| / 127
+        scale = (max_abs / 127.0).astype(np.float32)
+        scale[scale == 0] = 1.0
+        vectors = np.memmap(paths["vectors"], dtype=np.float32, mode="r", shape=(len(ids), dim))
+        codes = np.lib.format.open_memmap(paths["codes"], mode="w+", dtype=np.int8, shape=(len(ids), dim))
+        for start in range(0, len(ids), SCAN_BLOCK_ROWS):
+            block = vectors[start:start + SCAN_BLOCK_ROWS]
+            codes[start:start + len(block)] = np.clip(np.rint(block / scale), -127, 127)
+        codes.flush()
+        del codes, vectors
+
+        np.save(paths["scale"], scale)
+        np.save(paths["tag_ids"], np.asarray(tag_ids, dtype=np.int32))
+        with open(paths["meta"], "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "tag_vocab": list(vocab), "dim": int(dim), "info": info or {}}, f)
+        self.load()
+        return len(ids)
+
+    def load(self) -> bool:
+        paths = self._paths
+        if not os.path.exists(paths["meta"]) or not os.path.exists(paths["tag_ids"]):
+            # 旧版索引 (标签以字符串列表保存) 视为不存在，由调用方重建
+            return False
+        with open(paths["meta"], "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.ids = meta["ids"]
+        self.tag_vocab = meta["tag_vocab"]
+        self._tag_index = {t: i for i, t in enumerate(self.tag_vocab)}
+        self.info = meta.get("info", {})
+        self.codes = np.load(paths["codes"])
+        self.scale = np.load(paths["scale"])
+        self.tag_ids = np.load(paths["tag_ids"])
+        self.vectors = np.memmap(paths["vectors"], dtype=np.float32, mode="r", shape=(len(self.ids), meta["dim"]))
+        return True
+
+    def _rows_for_tags(self, allowed_tags: set) -> np.ndarray:
+        wanted = [self._tag_index[t] for t in allowed_tags if t in self._tag_index]
+        lookup = np.zeros(len(self.tag_vocab), dtype=bool)
+        lookup[wanted] = True
+        return np.flatnonzero(lookup[self.tag_ids])
+
+    def search(self, query: np.ndarray, k: int = 5, rerank_factor: int = 8,
+               allowed_tags: Optional[set] = None) -> List[Tuple[str, float]]:
+        """
+        粗排 (int8 内积) -> 取 k*rerank_factor 个候选 -> float32 精确内积重打分
+        :return: [(id, score)]，按得分降序
+        """
+        if not self.ids:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        # (q * scale) · code == q · (code * scale)，无需整体反量化
+        scaled_query = query * self.scale
+
+        # 按标签过滤时只扫描命中的行 (命名空间通常只占共享库的一小部分)
+        rows = self._rows_for_tags(allowed_tags) if allowed_tags is not None else None
+        n_rows = len(self.ids) if rows is None else len(rows)
+        if n_rows == 0:
+            return []
+
+        approx = np.empty(n_rows, dtype=np.float32)
+        buf = np.empty((min(SCAN_BLOCK_ROWS, n_rows), self.codes.shape[1]), dtype=np.float32)
+        for start in range(0, n_rows, SCAN_BLOCK_ROWS):
+            block = self.codes[start:start + SCAN_BLOCK_ROWS] if rows is None \
+                else self.codes[rows[start:start + SCAN_BLOCK_ROWS]]
+            # 复用同一块 float32 缓冲区，避免每块重新分配
+            dequant = buf[:len(block)]
+            dequant[...] = block
+            np.dot(dequant, scaled_query, out=approx[start:start + len(block)])
+
+        n_candidates = min(n_rows, max(k, k * rerank_factor))
+        candidates = np.argpartition(-approx, n_candidates - 1)[:n_candidates]
+        if rows is not None:
+            candidates = rows[candidates]
+
+        # memmap 按行号升序读取，磁盘访问更连续
+        candidates.sort()
+        exact = self.vectors[candidates] @ query
+        order = np.argsort(-exact)[:k]
+        return [(self.ids[candidates[i]], float(exact[i])) for i in order]
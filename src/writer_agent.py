@@ -4,36 +4,125 @@ import os
 import json
 import re
 import logging
-from typing import List, Dict, Any
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from typing import Any, Dict, Iterator, List, Optional
 
-from src.llm_client import LLMClient
+from src.context_builder import ContextBuilder
+from src.json_stream import IncrementalJSONParser, loads_tolerant, validate
+from src.llm_client import HedgePolicy, LLMClient
 from src.rag_engine import RAGEngine
-from src.search_engine import ImageSearcher
+from src.search_engine import ImageSearcher, PageFetcher
 
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
+# 所有任务共享的持久化向量库，各任务以命名空间隔离
+SHARED_VECTOR_DB = "./output/vector_store"
+
+# 写作前等待预取搜索结果的最长时间 (秒)：超时后不再等待，直接基于已有资料写作
+WEB_PREFETCH_WAIT = 45
+
+# 大纲中每章的字段类型；search_queries / image_keyword 缺失时由章节内兜底调用生成
+PLAN_SECTION_SCHEMA = {
+    "title": str,
+    "description": str,
+    "search_queries": (list, str),
+    "image_keyword": str,
+}
+
 class WriterAgent:
-    def __init__(self, output_dir="./output"):
-        self.llm = LLMClient()
+    def __init__(self, output_dir="./output", structured_plan: bool = True,
+                 context_token_budget: int = 1800, page_fetch_top_k: int = 3,
+                 use_web_kb: bool = False, web_kb_path: str = "./output/web_kb",
+                 vector_db_path: str = SHARED_VECTOR_DB,
+                 model_routes: Optional[Dict[str, List[str]]] = None,
+                 hedge_requests: bool = False):
+        # hedge_requests: 开启对冲请求，截断偶发的慢调用 (会额外消耗少量调用额度)；
+        # 延迟历史与对冲额度在各任务间共享并保存在 output/stats/hedge.json
+        self.llm = LLMClient(routes=model_routes, hedge=HedgePolicy.shared() if hedge_requests else None)
         self.output_dir = output_dir
         self.assets_dir = os.path.join(self.output_dir, "assets")
         os.makedirs(self.assets_dir, exist_ok=True)
 
-        # 任务隔离：确保 RAG 纯净
-        task_db_path = os.path.join(self.output_dir, "chroma_db")
-        self.rag = RAGEngine(vector_db_path=task_db_path)
+        # 任务隔离：共享向量库 + 以任务目录名作为命名空间，确保 RAG 纯净且同一文档只向量化一次
+        namespace = os.path.basename(os.path.abspath(self.output_dir))
+        # 可选：跨任务共享的互联网知识库，命中足够时跳过联网搜索
+        self.use_web_kb = use_web_kb
+        self.web_kb_min_hits = 3
+        self.rag = RAGEngine(
+            vector_db_path=vector_db_path,
+            namespace=namespace,
+            web_kb_path=web_kb_path if use_web_kb else None,
+            embedding_cache_path=os.path.join(vector_db_path, "query_embeddings.sqlite")
+        )
         
         self.searcher = ImageSearcher()
+        # 抓取排名靠前的搜索结果全文 (0 表示只使用搜索摘要)
+        self.page_fetch_top_k = page_fetch_top_k
+        self.page_fetcher = PageFetcher() if page_fetch_top_k > 0 else None
         
-        # 模型配置
-        self.model_planner = "deepseek-ai/DeepSeek-V3"
-        self.model_writer = "Qwen/Qwen2.5-72B-Instruct" 
-        self.model_visualizer = "Qwen/Qwen2.5-72B-Instruct"
+        # 模型配置：按任务类型路由 (plan / write / query_gen / keyword)，
+        # 默认路由见 llm_client.DEFAULT_MODEL_ROUTES，可通过 model_routes 覆盖
+
+        # 结构化规划：大纲阶段一次性产出每章的搜索词与配图关键词，
+        # 章节内的辅助 LLM 调用仅作为兜底
+        self.structured_plan = structured_plan
+        # 大纲解析不出任何章节时的重新规划次数
+        self.plan_retries = 1
+
+        # 上下文组装：去重 + 重排 + token 预算
+        self.context_builder = ContextBuilder(token_budget=context_token_budget)
+
+        # 预取：大纲生成后立即在后台发起联网搜索与配图下载，与写作调用重叠
+        # 搜索与配图分两个线程池：单次配图下载可能长达数分钟，不能让后续章节的搜索排在它后面
+        self._web_pool = None
+        self._image_pool = None
+        self._prefetched: Dict[int, Dict[str, Future]] = {}
 
     def plan_outline(self, topic: str) -> List[Dict]:
-        """Step 1: 生成大纲 (增强版 JSON 修复)"""
-        prompt = f"""
+        """Step 1: 生成大纲 (一次性返回完整列表)"""
+        return list(self.iter_outline(topic))
+
+    def iter_outline(self, topic: str) -> Iterator[Dict]:
+        """
+        Step 1 (流式): 边生成边解析大纲，每章对象一闭合就立即产出，
+        调用方可在大纲生成完毕前就为前几章派发预取任务
+        没有解析出任何章节时重新规划，最多重试 plan_retries 次
+        """
+        prompt = self._build_plan_prompt(topic)
+        for attempt in range(self.plan_retries + 1):
+            if attempt:
+                print(f"⚠️ 大纲解析失败，第 {attempt} 次重新规划...")
+            parser = IncrementalJSONParser()
+            chunks = []
+            emitted = 0
+            for chunk in self.llm.stream_task("plan", prompt, json_mode=True):
+                chunks.append(chunk)
+                for item in parser.feed(chunk):
+                    section = self._validate_section(item)
+                    if section:
+                        emitted += 1
+                        yield section
+
+            if emitted:
+                # 输出被截断时，最后一章只要标题完整 (已开始输出摘要) 就保留
+                for item in parser.finish():
+                    section = self._validate_section(item, required=("title", "description"))
+                    if section:
+                        yield section
+                return
+
+            # 流式解析无结果 (如非常规结构)：整体修复后再解析一次
+            outline = self._parse_outline("".join(chunks))
+            if outline:
+                yield from outline
+                return
+        logger.error("大纲生成失败：多次重试后仍无法解析出有效章节")
+
+    def _build_plan_prompt(self, topic: str) -> str:
+        if self.structured_plan:
+            return self._build_structured_plan_prompt(topic)
+        return f"""
         你是一名专业的技术主编。请根据主题 "{topic}" 规划一篇文章的大纲。
         
         🔴 **严格格式要求**：
@@ -47,54 +136,159 @@ class WriterAgent:
             {{"title": "第二章标题", "description": "摘要..."}}
         ]
         """
-        response = self.llm.call_llm(prompt, self.model_planner, json_mode=True)
+
+    def _parse_outline(self, response: str) -> List[Dict]:
+        """完整响应的兜底解析 (修复 JSON -> 结构标准化 -> 正则提取)"""
+        try:
+            data = loads_tolerant(response)
+        except json.JSONDecodeError:
+            # 提取所有包含 "title" 的平铺对象（兼容带 search_queries 等附加字段的结构化大纲）
+            pattern = r'\{[^{}]*"title"\s*:[^{}]*\}'
+            data = []
+            for m in re.findall(pattern, response or "", re.DOTALL):
+                try:
+                    data.append(loads_tolerant(m))
+                except json.JSONDecodeError:
+                    continue
+
+        # 结构标准化 (Dict 转 List)
+        outline = []
+        if isinstance(data, list):
+            outline = data
+        elif isinstance(data, dict):
+            # 情况 A: {"chapters": [ ... ]}
+            for key, val in data.items():
+                if isinstance(val, list):
+                    outline = val
+                    break
+
+            # 情况 B: {"0": {...}, "1": {...}}
+            if not outline:
+                sorted_keys = sorted(data.keys(), key=lambda x: int(str(x)) if str(x).isdigit() else x)
+                outline = [data[k] for k in sorted_keys if isinstance(data[k], dict)]
+
+            # 情况 C: 只有一章的裸对象
+            if not outline and data.get('title'):
+                outline = [data]
+
+        sections = [self._validate_section(sec) for sec in outline]
+        return [sec for sec in sections if sec]
+
+    def _validate_section(self, item, required=("title",)) -> Optional[Dict]:
+        """按大纲 schema 校验单章，不合格返回 None"""
+        section = validate(item, PLAN_SECTION_SCHEMA, required=required)
+        if section is None:
+            return None
+        section.setdefault('description', '')
+        return self._normalize_section(section)
+
+    def _build_structured_plan_prompt(self, topic: str) -> str:
+        """结构化大纲 Prompt：一次调用产出标题、摘要、搜索词与英文配图关键词"""
+        return f"""
+        你是一名专业的技术主编。请根据主题 "{topic}" 规划一篇文章的大纲，并为每一章准备检索素材。
+        
+        🔴 **严格格式要求**：
+        1. 必须返回一个标准的 **JSON 数组** (Array of Objects)。
+        2. **禁止**返回字典或带索引的对象（如 {{"0": {{...}}}}）。
+        3. 不要包含 Markdown 标记。
+        4. 每个对象必须包含以下字段：
+           - "title": 章节标题
+           - "description": 章节摘要
+           - "search_queries": 2 个互联网搜索查询词（一个宽泛词，一个精准词）
+           - "image_keyword": 1 个最适合做本章插图的**英文**搜索关键词（2-4 个单词）
         
+        正确格式示例：
+        [
+            {{"title": "第一章标题", "description": "摘要...", "search_queries": ["{topic} latest news", "第一章 data analysis"], "image_keyword": "rocket launch pad"}},
+            {{"title": "第二章标题", "description": "摘要...", "search_queries": ["...", "..."], "image_keyword": "..."}}
+        ]
+        """
+
+    def _normalize_section(self, section: Dict) -> Dict:
+        """清洗结构化字段：缺失或格式错误的字段直接丢弃，交由章节内兜底调用生成"""
+        section = dict(section)
+
+        queries = section.get('search_queries')
+        if isinstance(queries, str):
+            queries = queries.split(',')
+        if isinstance(queries, list):
+            queries = [str(q).strip() for q in queries if str(q).strip()]
+        if queries:
+            section['search_queries'] = queries[:2]
+        else:
+            section.pop('search_queries', None)
+
+        keyword = self._clean_image_keyword(str(section.get('image_keyword') or ''))
+        if keyword:
+            section['image_keyword'] = keyword
+        else:
+            section.pop('image_keyword', None)
+
+        return section
+
+    @staticmethod
+    def _clean_image_keyword(keyword: str) -> str:
+        return re.sub(r'[^a-zA-Z0-9\s]', '', keyword).strip()
+
+    def prefetch(self, topic: str, outline: List[Dict]):
+        """Step 1.5: 大纲就绪后，为每一章在后台预取搜索结果与候选配图"""
+        for i, section in enumerate(outline):
+            self.prefetch_section(topic, section, i + 1)
+
+    def prefetch_section(self, topic: str, section: Dict, index: int):
+        """为单章提交后台任务；index 与 write_single_section 的 index 保持一致"""
+        if index in self._prefetched:
+            return
+        if self._web_pool is None:
+            self._web_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch-web")
+            self._image_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch-image")
+
+        title = section.get('title', f'Section {index}')
+        desc = section.get('description', '')
+        jobs = {}
+
+        jobs['web'] = self._web_pool.submit(
+            self._prefetch_web, topic, title, desc, section.get('search_queries')
+        )
+
+        keyword = section.get('image_keyword')
+        if keyword:
+            jobs['image'] = self._image_pool.submit(self.searcher.search_and_download, keyword, self.assets_dir)
+
+        self._prefetched[index] = jobs
+
+    def close(self):
+        """释放预取线程池与网页抓取器"""
+        for pool in (self._web_pool, self._image_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._web_pool = self._image_pool = None
+        self._prefetched.clear()
+        if self.page_fetcher is not None:
+            self.page_fetcher.close()
+
+    def _prefetch_web(self, topic, title, desc, queries):
+        """后台任务：(必要时) 生成搜索词并执行联网搜索，返回 (搜索词, 结果)"""
+        if not queries:
+            queries = self._generate_search_queries(topic, title, desc)
+        return queries, self._gather_web(queries, kb_query=f"{topic} {title} {desc}")
+
+    @staticmethod
+    def _future_result(future: Future, default=None, timeout: Optional[float] = None):
+        """
+        取预取结果；任务尚未开始执行时直接取消并返回 default (由调用方当场执行)，
+        执行中的任务最多等待 timeout 秒
+        """
+        if future is None or future.cancel():
+            return default
         try:
-            # 1. 基础清洗
-            clean_json = response.replace("```json", "").replace("```", "").strip()
-            
-            # 2. 尝试直接解析
-            try:
-                data = json.loads(clean_json)
-            except json.JSONDecodeError:
-                # 如果解析失败，尝试修复常见错误（如键名未加引号）
-                # 这里使用一个简单的正则提取策略作为兜底
-                # 提取所有 {"title": ..., "description": ...} 结构
-                pattern = r'\{\s*"title":\s*".*?",\s*"description":\s*".*?"\s*\}'
-                matches = re.findall(pattern, clean_json, re.DOTALL)
-                if matches:
-                    data = [json.loads(m) for m in matches]
-                else:
-                    return []
-
-            # 3. 【核心修复】结构标准化 (Dict 转 List)
-            # 解决 0: {...}, 1: {...} 这种字典格式
-            outline = []
-            if isinstance(data, list):
-                outline = data
-            elif isinstance(data, dict):
-                # 如果是字典，可能是 {"outline": [...]} 或 {"0": {...}, "1": {...}}
-                # 策略：优先找 list 类型的 value，找不到则取所有 dict 类型的 value
-                
-                # 情况 A: {"chapters": [ ... ]}
-                for key, val in data.items():
-                    if isinstance(val, list):
-                        outline = val
-                        break
-                
-                # 情况 B: {"0": {...}, "1": {...}}
-                if not outline:
-                    # 按 key 排序后取 value
-                    sorted_keys = sorted(data.keys(), key=lambda x: int(str(x)) if str(x).isdigit() else x)
-                    for k in sorted_keys:
-                        if isinstance(data[k], dict):
-                            outline.append(data[k])
-            
-            return outline
-            
+            return future.result(timeout=timeout)
+        except FuturesTimeout:
+            logger.warning(f"预取任务超过 {timeout} 秒仍未完成，不再等待")
+            return default
         except Exception as e:
-            logger.error(f"大纲解析严重错误: {e}")
-            return []
+            logger.warning(f"预取任务失败: {e}")
+            return default
 
     def write_single_section(self, topic: str, section: Dict, index: int) -> Dict[str, Any]:
         """
@@ -103,54 +297,53 @@ class WriterAgent:
         title = section.get('title', f'Section {index}')
         desc = section.get('description', '')
         
+        prefetched = self._prefetched.pop(index, {})
+
+        web_future = prefetched.get('web')
+        search_queries, web_results = self._future_result(web_future, (None, None), timeout=WEB_PREFETCH_WAIT)
+        if web_future is not None and web_future.running():
+            # 预取卡住 (如搜索接口无响应)：不再重复搜索，直接基于本地资料与通用知识写作
+            web_results = []
+
         # --- 1. 智能生成搜索关键词 (避免搜不到内容) ---
-        # 以前是 f"{topic} {title}"，现在让 LLM 变通一下
-        search_queries = self._generate_search_queries(topic, title, desc)
+        # 优先使用结构化大纲中已规划好的搜索词，缺失时才单独调用 LLM
+        if not search_queries:
+            search_queries = section.get('search_queries') or self._generate_search_queries(topic, title, desc)
         
         # --- 2. 混合检索 ---
         
-        # A. 本地 RAG
+        # A. 本地 RAG (多取一些候选，交给上下文组装重排筛选)
         rag_query = f"{topic} {title} {desc}"
-        rag_results = self.rag.query_knowledge_base(rag_query, top_k=2)
+        rag_results = self.rag.query_knowledge_base(rag_query, top_k=6)
         
-        # B. 互联网搜索 (多词尝试)
-        web_results = []
-        seen_urls = set()
-        
-        # 对生成的每个搜索词都试一下
-        for query in search_queries:
-            results = self.searcher.search_text(query, max_results=2)
-            for r in results:
-                if r['href'] not in seen_urls:
-                    web_results.append(r)
-                    seen_urls.add(r['href'])
-        
-        # 限制数量，防止上下文溢出
-        web_results = web_results[:4]
+        # B. 互联网搜索 (已预取则直接取结果)
+        if web_results is None:
+            web_results = self._gather_web(search_queries, kb_query=rag_query)
         
         # --- 3. 构造上下文 ---
-        context_parts = []
-        
-        if rag_results:
-            context_parts.append("【本地文件资料 (Priority High)】：")
-            for idx, txt in enumerate(rag_results):
-                context_parts.append(f"[Local-{idx+1}] {txt[:400]}...")
-
-        if web_results:
-            context_parts.append("【互联网最新资讯 (Priority Medium)】：")
-            for w in web_results:
-                context_parts.append(f"来源: [{w['title']}]({w['href']})\n内容摘要: {w['body']}")
-        
-        if not context_parts:
-            context_parts.append("（暂无直接参考资料，请基于您的专业知识撰写。）")
-            
-        full_context_str = "\n\n".join(context_parts)
+        full_context_str, rag_results, web_results = self.context_builder.build(
+            f"{title} {desc}", rag_results, web_results
+        )
+        if not full_context_str:
+            full_context_str = "（暂无直接参考资料，请基于您的专业知识撰写。）"
+        # 同一网页的多个片段在 UI 中只展示一次
+        web_results = list({w['href']: w for w in web_results}.values())
         
         # --- 4. 写作 ---
         content = self._generate_text_with_citation(topic, title, desc, full_context_str)
         
         # --- 5. 配图 ---
-        img_md, img_path, keyword = self._auto_append_image(content)
+        # 预取的候选图可用则直接采用；预取失败时改用从正文提取的关键词重新搜图
+        image_future = prefetched.get('image')
+        prefetched_image = self._future_result(image_future)
+        if prefetched_image and os.path.exists(prefetched_image):
+            keyword = section.get('image_keyword', '')
+            img_path = prefetched_image
+            img_md = self._image_markdown(keyword, img_path)
+        else:
+            # 预取已执行却失败时改用正文关键词；尚未开始 (已取消) 时仍用大纲给出的关键词
+            hint = None if image_future and not image_future.cancelled() else section.get('image_keyword')
+            img_md, img_path, keyword = self._auto_append_image(content, keyword=hint)
         
         full_md = f"## {title}\n\n{content}\n\n{img_md}\n\n---\n\n"
 
@@ -165,6 +358,51 @@ class WriterAgent:
             "image_path": img_path
         }
 
+    def _search_web(self, search_queries: List[str]) -> List[Dict]:
+        """互联网搜索 (多词尝试，按 URL 去重)"""
+        web_results = []
+        seen_urls = set()
+        
+        # 对生成的每个搜索词都试一下
+        for query in search_queries:
+            results = self.searcher.search_text(query, max_results=4)
+            for r in results:
+                if r['href'] not in seen_urls:
+                    web_results.append(r)
+                    seen_urls.add(r['href'])
+        
+        # 候选数量上限；最终入选条数由 ContextBuilder 按 token 预算决定
+        return web_results[:8]
+
+    def _gather_web(self, search_queries: List[str], kb_query: str = "") -> List[Dict]:
+        """搜索 + 抓取全文：返回搜索摘要与网页正文片段，统一交给 ContextBuilder 挑选"""
+        # 0. 先查本地的互联网知识库，命中足够时不再联网
+        kb_results = self.rag.query_web_knowledge(kb_query) if self.use_web_kb and kb_query else []
+        if len(kb_results) >= self.web_kb_min_hits:
+            logger.info(f"互联网知识库命中 {len(kb_results)} 条，跳过联网搜索")
+            return kb_results
+
+        web_results = self._search_web(search_queries)
+        if not web_results:
+            return kb_results
+
+        pages = {}
+        top_hits = web_results[:self.page_fetch_top_k] if self.page_fetcher else []
+        if top_hits:
+            pages = self.page_fetcher.fetch_many([w['href'] for w in top_hits])
+        expanded = kb_results + web_results
+        for w in top_hits:
+            for chunk in PageFetcher.chunk_text(pages.get(w['href'], '')):
+                expanded.append({"title": w['title'], "href": w['href'], "body": chunk})
+
+        if self.use_web_kb:
+            # 有全文存全文，否则存搜索摘要
+            self.rag.add_web_documents([
+                {"url": w['href'], "title": w['title'], "text": pages.get(w['href']) or w.get('body', '')}
+                for w in web_results
+            ])
+        return expanded
+
     def _generate_search_queries(self, topic, title, desc) -> List[str]:
         """让 LLM 将章节意图转化为 2-3 个搜索引擎友好的关键词"""
         prompt = f"""
@@ -177,7 +415,7 @@ class WriterAgent:
         2. 一个精准词 (例如: "{title} data analysis")
         3. 直接返回关键词，用逗号分隔，不要解释。
         """
-        response = self.llm.call_llm(prompt, self.model_planner)
+        response = self.llm.call_task("query_gen", prompt)
         # 清洗
         queries = [q.strip() for q in response.split(',') if q.strip()]
         # 兜底
@@ -202,16 +440,11 @@ class WriterAgent:
         4. **深度与逻辑**：综合分析，不要罗列。
         5. **字数**：400-600字。
         """
-        return self.llm.call_llm(prompt, self.model_writer)
+        return self.llm.call_task("write", prompt)
 
-    def _auto_append_image(self, text_content: str):
-        prompt = f"""
-        阅读以下文本，提取一个最适合做插图的“英文搜索关键词”。
-        文本：{text_content[:300]}...
-        要求：只返回关键词，不要解释。必须是英文。
-        """
-        keyword = self.llm.call_llm(prompt, self.model_visualizer).strip()
-        keyword = re.sub(r'[^a-zA-Z0-9\s]', '', keyword)
+    def _auto_append_image(self, text_content: str, keyword: str = None):
+        if not keyword:
+            keyword = self._extract_image_keyword(text_content)
         
         if not keyword:
             return "", None, ""
@@ -219,7 +452,20 @@ class WriterAgent:
         image_path = self.searcher.search_and_download(keyword, self.assets_dir)
         
         if image_path:
-            rel_path = os.path.relpath(image_path, self.output_dir).replace("\\", "/")
-            return f"![图：{keyword}]({rel_path})", image_path, keyword
+            return self._image_markdown(keyword, image_path), image_path, keyword
         else:
             return f"> *(配图失败: {keyword})*", None, keyword
+
+    def _image_markdown(self, keyword: str, image_path: str) -> str:
+        rel_path = os.path.relpath(image_path, self.output_dir).replace("\\", "/")
+        return f"![图：{keyword}]({rel_path})"
+
+    def _extract_image_keyword(self, text_content: str) -> str:
+        """兜底：大纲未提供配图关键词时，从正文中提取"""
+        prompt = f"""
+        阅读以下文本，提取一个最适合做插图的“英文搜索关键词”。
+        文本：{text_content[:300]}...
+        要求：只返回关键词，不要解释。必须是英文。
+        """
+        keyword = self.llm.call_task("keyword", prompt).strip()
+        return self._clean_image_keyword(keyword)
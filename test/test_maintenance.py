@@ -0,0 +1,110 @@
+# test/test_maintenance.py
+# 运行: python -m pytest -q test/test_maintenance.py
+
+import json
+import os
+import time
+import zipfile
+
+from src.maintenance import (
+    ACTIVE_GRACE_SECONDS, ARCHIVE_DIR, ARCHIVE_FILE, MANIFEST_FILE,
+    compact_tasks, enforce_retention, load_task_index, scan_tasks, select_for_archive,
+)
+
+DAY = 86400
+
+
+def make_task(output_dir, name, age_days, article=True, docx=True, chroma_bytes=0):
+    """在输出目录下伪造一个任务，所有文件的 mtime 设为 age_days 天前"""
+    task_dir = output_dir / name
+    (task_dir / "assets").mkdir(parents=True)
+    (task_dir / "assets" / "img_1.jpg").write_bytes(b"\xff\xd8" + b"x" * 2000)
+    if article:
+        (task_dir / "final_article.md").write_text(f"# {name}\n\n正文" * 50, encoding="utf-8")
+    if docx:
+        (task_dir / "final_article.docx").write_bytes(b"PK" + b"d" * 3000)
+    if chroma_bytes:
+        (task_dir / "chroma_db").mkdir()
+        (task_dir / "chroma_db" / "chroma.sqlite3").write_bytes(b"\0" * chroma_bytes)
+    stamp = time.time() - age_days * DAY
+    for root, _, files in os.walk(task_dir):
+        for f in files:
+            os.utime(os.path.join(root, f), (stamp, stamp))
+    return task_dir
+
+
+def test_running_task_does_not_count_toward_max_tasks(tmp_path):
+    for i in range(5):
+        make_task(tmp_path, f"2024010{i}_article", age_days=10 - i)
+    # 运行中的任务：只有 assets，刚刚还在写入
+    make_task(tmp_path, "20240109_running", age_days=0, article=False, docx=False)
+
+    selected = {t["name"] for t in select_for_archive(scan_tasks(tmp_path), max_tasks=2)}
+
+    assert selected == {"20240100_article", "20240101_article", "20240102_article"}
+
+
+def test_active_tasks_are_never_selected(tmp_path):
+    make_task(tmp_path, "old_failed", age_days=40, article=False, docx=False)
+    make_task(tmp_path, "running", age_days=0, article=False, docx=False)
+    make_task(tmp_path, "old_article", age_days=40)
+    tasks = scan_tasks(tmp_path)
+
+    selected = {t["name"] for t in select_for_archive(tasks, max_age_days=30, max_tasks=0)}
+    assert selected == {"old_failed", "old_article"}
+
+    # 刚写完文章、仍在生成 Word 的任务同样不归档
+    later = time.time() + ACTIVE_GRACE_SECONDS / 2
+    fresh = make_task(tmp_path, "fresh_article", age_days=0)
+    assert "fresh_article" not in {
+        t["name"] for t in select_for_archive(scan_tasks(tmp_path), max_tasks=0, now=later)
+    }
+    assert fresh.exists()
+
+
+def test_max_total_mb_archives_oldest_articles_first(tmp_path):
+    for i in range(4):
+        make_task(tmp_path, f"task{i}", age_days=10 - i)
+    tasks = scan_tasks(tmp_path, with_size=True)
+    per_task = tasks[0]["size"]
+
+    selected = [t["name"] for t in select_for_archive(tasks, max_total_mb=2.5 * per_task / 2**20)]
+
+    assert selected == ["task1", "task0"]
+
+
+def test_archive_manifest_round_trip(tmp_path):
+    make_task(tmp_path, "20240101_old", age_days=40, chroma_bytes=50_000)
+    make_task(tmp_path, "20240301_new", age_days=1)
+    load_task_index(tmp_path)
+
+    report = enforce_retention(str(tmp_path), max_age_days=30)
+
+    assert report["archived"] == ["20240101_old"]
+    assert not (tmp_path / "20240101_old").exists()
+    # 释放空间包含被丢弃的 chroma_db
+    assert report["freed_bytes"] > 50_000
+
+    archive_dir = tmp_path / ARCHIVE_DIR
+    manifest = json.loads((archive_dir / MANIFEST_FILE).read_text(encoding="utf-8"))
+    entry = manifest["tasks"]["20240101_old"]
+    assert sorted(entry["files"]) == ["assets/img_1.jpg", "final_article.docx", "final_article.md"]
+    with zipfile.ZipFile(archive_dir / ARCHIVE_FILE) as zf:
+        assert sorted(zf.namelist()) == sorted(f"20240101_old/{f}" for f in entry["files"])
+        article = zf.read("20240101_old/final_article.md").decode("utf-8")
+    assert article.startswith("# 20240101_old")
+
+    assert list(load_task_index(tmp_path)) == ["20240301_new"]
+
+
+def test_drop_docx_and_rearchive_same_name(tmp_path):
+    make_task(tmp_path, "task", age_days=40)
+    compact_tasks(str(tmp_path), ["task"], keep_docx=False)
+    make_task(tmp_path, "task", age_days=40)
+    archived = compact_tasks(str(tmp_path), ["task"])
+
+    manifest = json.loads((tmp_path / ARCHIVE_DIR / MANIFEST_FILE).read_text(encoding="utf-8"))
+    assert "final_article.docx" not in manifest["tasks"]["task"]["files"]
+    (arc_name,) = archived
+    assert arc_name.startswith("task__")
+    assert "final_article.docx" in manifest["tasks"][arc_name]["files"]
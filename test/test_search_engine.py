@@ -0,0 +1,48 @@
+# test/test_search_engine.py
+# 运行: python -m pytest -q test/test_search_engine.py
+
+from src.search_engine import PageFetcher
+
+PARAGRAPH = "星舰是 SpaceX 研制的完全可重复使用的超重型运载火箭系统，目标是把人类送往火星。"
+
+
+def page(body: str) -> str:
+    return f"<html><head><title>t</title></head><body>{body}</body></html>"
+
+
+def test_wrapper_class_containing_sidebar_is_kept():
+    html = page(f"""
+        <div class="container layout-with-sidebar">
+          <main><article><p>{PARAGRAPH}</p></article></main>
+          <div class="sidebar"><p>侧边栏推荐阅读：这是一段不应出现在正文里的推荐文字。</p></div>
+        </div>""")
+
+    text = PageFetcher.extract_text(html)
+
+    assert PARAGRAPH in text
+    assert "侧边栏" not in text
+
+
+def test_wordpress_category_classes_on_article_are_kept():
+    html = page(f"""
+        <nav class="menu"><p>首页 / 新闻 / 关于我们 这是导航栏里的一段很长的文字</p></nav>
+        <article class="post type-post category-navigation-tech tag-share-economy">
+          <p>{PARAGRAPH}</p>
+          <div class="share-buttons"><p>分享到微博、微信与朋友圈，欢迎转发本文</p></div>
+        </article>""")
+
+    text = PageFetcher.extract_text(html)
+
+    assert PARAGRAPH in text
+    assert "分享到" not in text
+    assert "首页" not in text
+
+
+def test_text_dense_block_survives_boilerplate_class():
+    body = "".join(f"<p>{PARAGRAPH}</p>" for _ in range(20))
+    html = page(f'<div id="comments">{body}</div><div class="related"><a href="/a">相关链接一二三四五六七八九十</a></div>')
+
+    text = PageFetcher.extract_text(html)
+
+    assert PARAGRAPH in text
+    assert "相关链接" not in text